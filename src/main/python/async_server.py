@@ -0,0 +1,348 @@
+import asyncio
+import concurrent.futures
+import resource
+
+import OpenSSL
+from OpenSSL import SSL
+from loguru import logger
+
+from src.main.python.framing import FrameReader
+from src.main.python.json_utils.json_response import JSONResponse
+from src.main.python.profiling import stage
+from src.main.python.metrics import registry
+from src.main.python.server import BUSY_MESSAGE, Server, admission_rejected_total, connection_timeouts_total, \
+    handshake_timeout, idle_timeout, listen_backlog, max_in_flight, open_connections, queue_size
+from src.main.python.settings import configuration
+from src.main.python.ssl_context_utils import SessionTicketKeys, record_handshake
+
+# CONSTANTS
+max_workers = configuration.getint("ASYNC_SERVER", "max_workers")
+max_connections = configuration.getint("ASYNC_SERVER", "max_connections")
+BUFFER_SIZE = 65536
+
+batch_queue_depth = registry.gauge("securehotel_batch_queue_depth",
+                                   "Batches of the async server waiting for a worker thread.")
+
+
+class TLSStream:
+    """
+    Non-blocking TLS over an asyncio stream.
+
+    The TLS state machine of pyOpenSSL runs over memory BIOs: encrypted bytes read from the socket
+    are written into the connection and the encrypted bytes produced by the connection are written
+    to the socket, so no call ever blocks the event loop.
+
+    The connection is created in server mode once the ClientHello arrives, with the SSL context
+    that can decrypt the session ticket offered in it.
+
+    Attributes:
+        connection (SSL.Connection): The pyOpenSSL connection working over memory BIOs, None until
+            the handshake starts.
+    """
+
+    def __init__(self, ticket_keys: SessionTicketKeys, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        """
+        Initializes the TLSStream.
+
+        Args:
+            ticket_keys (SessionTicketKeys): The SSL contexts of the server.
+            reader (asyncio.StreamReader): The reader of the TCP connection.
+            writer (asyncio.StreamWriter): The writer of the TCP connection.
+        """
+        self.ticket_keys = ticket_keys
+        self.reader = reader
+        self.writer = writer
+        self.connection = None
+
+    async def _flush(self) -> None:
+        """
+        Sends every encrypted byte pending in the outgoing BIO.
+        """
+        while True:
+            try:
+                data = self.connection.bio_read(BUFFER_SIZE)
+            except SSL.WantReadError:
+                break
+            self.writer.write(data)
+        await self.writer.drain()
+
+    async def _fill(self) -> bool:
+        """
+        Reads encrypted bytes from the socket into the incoming BIO.
+
+        Returns:
+            bool: False if the peer closed the TCP connection, True otherwise.
+        """
+        data = await self.reader.read(BUFFER_SIZE)
+        if not data:
+            self.connection.bio_shutdown()
+            return False
+        self.connection.bio_write(data)
+        return True
+
+    async def do_handshake(self) -> None:
+        """
+        Performs the TLS handshake.
+
+        Raises:
+            ConnectionError: If the peer closes the connection during the handshake.
+        """
+        if self.connection is None:
+            data = await self.reader.read(BUFFER_SIZE)
+            if not data:
+                raise ConnectionError("Connection closed during the TLS handshake")
+            self.connection = SSL.Connection(self.ticket_keys.context_for(data), None)
+            self.connection.set_accept_state()
+            self.connection.bio_write(data)
+        while True:
+            try:
+                self.connection.do_handshake()
+                await self._flush()
+                return
+            except SSL.WantReadError:
+                await self._flush()
+                if not await self._fill():
+                    raise ConnectionError("Connection closed during the TLS handshake")
+
+    async def recv(self, bufsize: int = BUFFER_SIZE) -> bytes:
+        """
+        Receives decrypted application data.
+
+        Args:
+            bufsize (int): The maximum number of bytes to return.
+
+        Returns:
+            bytes: The received data, or an empty bytes object if the peer closed the connection.
+        """
+        while True:
+            try:
+                data = self.connection.recv(bufsize)
+                await self._flush()
+                return data
+            except SSL.WantReadError:
+                await self._flush()
+                if not await self._fill():
+                    return b""
+            except SSL.ZeroReturnError:
+                return b""
+
+    async def sendall(self, data: bytes) -> None:
+        """
+        Encrypts and sends the given data.
+
+        Args:
+            data (bytes): The data to send.
+        """
+        self.connection.sendall(data)
+        await self._flush()
+
+    async def close(self) -> None:
+        """
+        Sends the TLS close notification and closes the TCP connection.
+        """
+        if self.connection is not None:
+            try:
+                self.connection.shutdown()
+                await self._flush()
+            except (SSL.Error, ConnectionError):
+                pass
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class AsyncServer(Server):
+    """
+    Server that serves every connection from a single asyncio event loop.
+
+    It speaks the same petition protocol as Server, but instead of one thread per connection it keeps
+    every connection in the event loop and only sends the CPU-bound work (signature checks and
+    database writes) to a pool of worker threads.
+    """
+
+    def __init__(self, host: str, port: int, is_test: bool = False, worker_id: int = None) -> None:
+        """
+        Initialize AsyncServer object.
+
+        Parameters:
+        - host (str): Host IP address.
+        - port (int): Port number.
+        - is_test (bool): Flag to indicate if in test mode.
+        - worker_id (int): Index of the worker process when run by the Supervisor, None otherwise.
+
+        """
+        super().__init__(host, port, is_test, worker_id)
+        self.loop = None
+        self.stopped = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or None)
+        self.connection_slots = None
+        self.batch_slots = None
+        self.waiting = 0
+
+    def start(self) -> None:
+        """
+        Start the server.
+
+        This method initializes the SSL context and runs the event loop until the server is stopped.
+        """
+        raise_file_limit()
+        asyncio.run(self.serve())
+
+    async def serve(self) -> None:
+        """
+        Listen for incoming connections until the server is stopped.
+        """
+        self.prepare()
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.connection_slots = asyncio.Semaphore(max_connections) if max_connections else None
+        self.batch_slots = asyncio.Semaphore(max_in_flight)
+        self.server_socket = await asyncio.start_server(self.handle_connection, self.host, int(self.port),
+                                                        backlog=listen_backlog, reuse_port=self.worker_id is not None)
+        self.running = True
+        logger.info(f"Async server listening on {self.host}:{self.port}")
+        async with self.server_socket:
+            await self.stopped.wait()
+        self.executor.shutdown(wait=True)
+        self.shutdown_services()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Admit a client connection and serve it.
+
+        An open connection only costs the event loop a file descriptor and its buffers, so the limit
+        is max_connections of the ASYNC_SERVER section, much higher than the number of handler threads
+        of Server, or none if it is 0. Connections beyond it are closed at once. The CPU-bound work is
+        bounded per batch, by serve_batch.
+
+        Args:
+            reader (asyncio.StreamReader): The reader of the TCP connection.
+            writer (asyncio.StreamWriter): The writer of the TCP connection.
+        """
+        if self.connection_slots is None:
+            await self.serve_connection(TLSStream(self.ticket_keys, reader, writer))
+            return
+        if self.connection_slots.locked():
+            admission_rejected_total.labels("dropped").inc()
+            writer.close()
+            return
+        async with self.connection_slots:
+            await self.serve_connection(TLSStream(self.ticket_keys, reader, writer))
+
+    async def serve_batch(self, received_message: bytes, codec) -> JSONResponse:
+        """
+        Process a batch of petitions in the worker threads.
+
+        At most max_in_flight batches are processed at once, and up to queue_size more wait for their
+        turn. Beyond that the batch is answered BUSY without being processed.
+
+        Args:
+            received_message (bytes): The encoded array of petitions sent by the client.
+            codec (JSONCodec | MsgPackCodec): The codec of the connection.
+
+        Returns:
+            JSONResponse: The response for the client.
+        """
+        if self.batch_slots.locked() and self.waiting >= queue_size:
+            admission_rejected_total.labels("in_flight").inc()
+            return JSONResponse("BUSY", BUSY_MESSAGE)
+
+        self.waiting += 1
+        batch_queue_depth.set(self.waiting)
+        try:
+            await self.batch_slots.acquire()
+        finally:
+            self.waiting -= 1
+            batch_queue_depth.set(self.waiting)
+        try:
+            return await self.loop.run_in_executor(self.executor, self.handle_message, received_message, codec)
+        finally:
+            self.batch_slots.release()
+
+    async def serve_connection(self, stream: TLSStream) -> None:
+        """
+        Serve the petitions of one client connection.
+
+        Args:
+            stream (TLSStream): The stream of the client.
+        """
+        frames = FrameReader()
+        open_connections.inc()
+        try:
+            try:
+                with stage("handshake"):
+                    await asyncio.wait_for(stream.do_handshake(), handshake_timeout)
+            except asyncio.TimeoutError:
+                connection_timeouts_total.labels("handshake").inc()
+                logger.error(f"Error: TLS handshake not completed in {handshake_timeout:g} seconds")
+                return
+            record_handshake(stream.connection)
+            logger.info(f"Connection established with {stream.writer.get_extra_info('peername')}")
+            while True:
+                try:
+                    data = await asyncio.wait_for(stream.recv(), idle_timeout)
+                except asyncio.TimeoutError:
+                    connection_timeouts_total.labels("idle").inc()
+                    logger.info(f"Closing connection idle for {idle_timeout:g} seconds.")
+                    break
+                if not data:
+                    logger.info("Connection closed by the client.")
+                    break
+                for received_message in frames.feed(data):
+                    message = await self.serve_batch(received_message, frames.codec)
+                    with stage("send"):
+                        await stream.sendall(frames.encode_message(message.to_dict()))
+        except OpenSSL.SSL.SysCallError as e:
+            logger.error(f"SSL error: {e}")
+            await self.send_error(stream, frames, JSONResponse("ERROR", f"SSL error: {e}"))
+        except Exception as e:
+            logger.opt(exception=True).error(f"Error: {e}")
+            await self.send_error(stream, frames, JSONResponse("ERROR", f"Error: {e}"))
+        finally:
+            open_connections.dec()
+            await stream.close()
+
+    @staticmethod
+    async def send_error(stream: TLSStream, frames: FrameReader, message: JSONResponse) -> None:
+        """
+        Send an error response, ignoring a connection that is already broken.
+
+        Args:
+            stream (TLSStream): The stream of the client.
+            frames (FrameReader): The frame reader of the connection, which knows the client's wire format.
+            message (JSONResponse): The error response.
+        """
+        if stream.connection is None:  # El cliente no llegó a enviar el ClientHello
+            return
+        try:
+            await stream.sendall(frames.encode_message(message.to_dict()))
+        except (SSL.Error, ConnectionError):
+            pass
+
+    def stop(self) -> None:
+        """
+        Stop the server.
+
+        It can be called from any thread.
+        """
+        self.running = False
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+
+def raise_file_limit() -> None:
+    """
+    Raises the soft limit of open files to the hard limit.
+
+    Every connection of the event loop keeps a file descriptor open, so the default soft limit
+    (usually 1024) would cap the number of concurrent clients.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError) as e:
+            logger.error(f"Could not raise the open files limit: {e}")
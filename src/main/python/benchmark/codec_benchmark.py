@@ -0,0 +1,54 @@
+"""
+Encode and decode time of every codec for JSONMessage, JSONResponse and petition batches.
+
+Compares the json module, orjson (when installed) and MessagePack (when installed, with the
+signatures and public keys of the petitions as raw bytes), and prints the size of every encoding.
+"""
+import argparse
+import time
+
+from src.main.python.benchmark.common import PetitionSigner, binary_petition
+from src.main.python.codec import JSONCodec, MsgPackCodec, msgpack, orjson
+from src.main.python.json_utils.json_message import JSONMessage
+from src.main.python.json_utils.json_response import JSONResponse
+
+
+def measure(function, argument, repeat: int) -> float:
+    """
+    Returns the mean microseconds of calling the function with the argument.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(argument)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    codecs = [JSONCodec("json")]
+    if orjson is not None:
+        codecs.append(JSONCodec("orjson"))
+    if msgpack is not None:
+        codecs.append(MsgPackCodec())
+
+    batch = PetitionSigner().batch(1, args.batch_size)
+    message = JSONMessage("1", "towels", 1, batch[0]["digitalSignature"], batch[0]["orderDate"])
+    documents = [
+        ("JSONMessage", message.to_dict(), None),
+        ("JSONResponse", JSONResponse("SUCCESS", "Message received successfully.").to_dict(), None),
+        (f"batch of {args.batch_size}", batch, [binary_petition(petition) for petition in batch]),
+    ]
+
+    print(f"{'document':<16}{'codec':<16}{'bytes':>8}{'encode us':>12}{'decode us':>12}")
+    for name, document, binary_document in documents:
+        for codec in codecs:
+            data = binary_document if codec.binary and binary_document is not None else document
+            payload = codec.dumps(data)
+            assert codec.loads(payload) == data
+            encode = measure(codec.dumps, data, args.repeat)
+            decode = measure(codec.loads, payload, args.repeat)
+            print(f"{name:<16}{codec.name:<16}{len(payload):>8}{encode:>12.2f}{decode:>12.2f}")
@@ -0,0 +1,173 @@
+"""
+Helpers shared by the benchmarks.
+
+The benchmarks are run from src/main/python, like the server, so that configuration.ini is found:
+
+    PYTHONPATH=../../.. python -m src.main.python.benchmark.<benchmark>
+"""
+import base64
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from Cryptodome.Hash import SHA256
+from Cryptodome.PublicKey import RSA
+from Cryptodome.Signature import pkcs1_15
+from OpenSSL import SSL
+
+from src.main.python.certificate_utils import generate_key_pair, generate_certificate
+from src.main.python.codec import MsgPackCodec, json_codec
+
+ORDER_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+CODEC_NAMES = ("json", "msgpack")
+
+
+def create_test_material(key_type: str = "rsa") -> tuple:
+    """
+    Creates the key material of a server with a self-signed certificate kept in memory.
+
+    Args:
+        key_type (str, optional): The type of the server key, "rsa" or "ecdsa".
+
+    Returns:
+        tuple: The private key, the certificate and the (empty) trusted certificates.
+    """
+    key = generate_key_pair(key_type)
+    return key, generate_certificate(key, "localhost"), []
+
+
+def client_codec(name: str):
+    """
+    Returns the codec a client uses for the given name.
+
+    Args:
+        name (str): "json" or "msgpack".
+
+    Returns:
+        JSONCodec | MsgPackCodec: The codec.
+    """
+    return MsgPackCodec() if name == "msgpack" else json_codec
+
+
+def binary_petition(petition: dict) -> dict:
+    """
+    Returns a copy of the petition with the digital signature and the public key as raw bytes,
+    as sent with a binary codec.
+
+    Args:
+        petition (dict): The petition in the JSON wire format.
+
+    Returns:
+        dict: The petition with raw bytes instead of base64.
+    """
+    return dict(petition, digitalSignature=base64.b64decode(petition["digitalSignature"]),
+                publicKey=base64.b64decode(petition["publicKey"]))
+
+
+def start_test_server(server_class: type, host: str, port: int, material: tuple = None):
+    """
+    Starts a server in a background thread with an in-memory certificate instead of the keystore.
+
+    Args:
+        server_class (type): Server or one of its subclasses.
+        host (str): Host IP address.
+        port (int): Port number.
+        material (tuple, optional): The key material to use, as returned by create_test_material. A
+            self-signed one is created if not given.
+
+    Returns:
+        Server: The running server.
+    """
+    material = material or create_test_material()
+
+    class TestServer(server_class):
+        def load_certificate(self) -> tuple:
+            return material
+
+    server = TestServer(host, port)
+    threading.Thread(target=server.start, daemon=True).start()
+    while not server.running:
+        time.sleep(0.05)
+    return server
+
+
+def connect(host: str, port: int, session: SSL.Session = None) -> SSL.Connection:
+    """
+    Opens a TLS connection to the server.
+
+    Args:
+        host (str): Host IP address.
+        port (int): Port number.
+        session (SSL.Session, optional): A session of a previous connection, to resume it.
+
+    Returns:
+        SSL.Connection: The connection, with the handshake done.
+    """
+    connection = SSL.Connection(SSL.Context(SSL.TLS_METHOD), socket.create_connection((host, port)))
+    connection.set_connect_state()
+    if session is not None:
+        connection.set_session(session)
+    connection.do_handshake()
+    return connection
+
+
+class PetitionSigner:
+    """
+    Builds petitions signed the way ClientPetition.verify_signature expects.
+
+    Attributes:
+        key (RSA.RsaKey): The private key of the client.
+        public_key (str): The base64 DER public key sent in every petition.
+    """
+
+    def __init__(self, key_size: int = 2048) -> None:
+        """
+        Initializes the PetitionSigner with a new key pair.
+
+        Args:
+            key_size (int, optional): The size of the RSA key in bits.
+        """
+        self.key = RSA.generate(key_size)
+        self.public_key = base64.b64encode(self.key.publickey().export_key("DER")).decode()
+        self.signer = pkcs1_15.new(self.key)
+
+    def petition(self, client_id: int, order_date: datetime, name_material: str = "towels", amount: int = 1) -> dict:
+        """
+        Builds one signed petition.
+
+        Args:
+            client_id (int): The client id.
+            order_date (datetime): The order date, which is what gets signed.
+            name_material (str, optional): The requested material.
+            amount (int, optional): The requested amount.
+
+        Returns:
+            dict: The petition in the wire format.
+        """
+        order_date = order_date.strftime(ORDER_DATE_FORMAT)
+        signature = self.signer.sign(SHA256.new(order_date.encode("utf-8")))
+        return {
+            "clientId": str(client_id),
+            "nameMaterial": name_material,
+            "amount": amount,
+            "digitalSignature": base64.b64encode(signature).decode(),
+            "orderDate": order_date,
+            "publicKey": self.public_key,
+        }
+
+    def batch(self, client_id: int, size: int, start: datetime = datetime(2024, 1, 1)) -> list:
+        """
+        Builds a batch of petitions of one client that the rate limiter accepts.
+
+        The order dates are five hours apart, so no three of them fall in the same four hours.
+
+        Args:
+            client_id (int): The client id.
+            size (int): The number of petitions.
+            start (datetime, optional): The order date of the first petition.
+
+        Returns:
+            list: The petitions.
+        """
+        return [self.petition(client_id, start + timedelta(hours=5 * i)) for i in range(size)]
@@ -0,0 +1,57 @@
+"""
+Write throughput of ClientPetition.insert_batch with N handler threads.
+
+Every thread takes a connection from the pool, inserts small batches and gives the connection back,
+as the handlers do. The run is repeated with the default rollback journal and with the configured
+pragmas (WAL), on a temporary database.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from src.main.python.models import ClientPetition, db, init_database, pragmas
+
+
+def run(path: str, database_pragmas: dict, threads: int, batches: int, batch_size: int) -> float:
+    """
+    Inserts the batches from the given number of threads and returns the petitions written per second.
+    """
+    init_database(path, database_pragmas)
+    with db.connection_context():
+        db.drop_tables([ClientPetition])
+        db.create_tables([ClientPetition])
+    rows = [{'client_id': 1, 'name_material': 'towels', 'amount': 1, 'order_date': datetime(2024, 1, 1)}] * batch_size
+
+    def worker():
+        for _ in range(batches):
+            with db.connection_context():
+                ClientPetition.insert_batch(rows)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    db.close_all()
+    return threads * batches * batch_size / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=4)
+    args = parser.parse_args()
+
+    rollback_journal = {'journal_mode': 'delete', 'synchronous': 'full', 'busy_timeout': pragmas['busy_timeout']}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, database_pragmas in (("rollback journal", rollback_journal), ("configured", pragmas)):
+            for threads in args.threads:
+                path = os.path.join(directory, f"{database_pragmas['journal_mode']}-{threads}.db")
+                throughput = run(path, database_pragmas, threads, args.batches, args.batch_size)
+                print(f"{name:<17} {threads:>3} threads: {throughput:10.0f} petitions/s")
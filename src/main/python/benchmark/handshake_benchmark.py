@@ -0,0 +1,109 @@
+"""
+Cost of the TLS handshake of a reconnecting client.
+
+Every iteration opens a connection, sends one petition and closes the connection, as the clients
+do for every batch. For an RSA 2048 and an ECDSA P-256 server key, compares:
+
+- full: the client never offers a session, so every handshake uses the private key of the server.
+- resumed: the client offers the session ticket of its previous connection.
+
+The client and the server share the process, so the server side of a full handshake is also
+measured alone, over memory BIOs.
+"""
+import argparse
+import itertools
+import json
+import time
+
+from OpenSSL import SSL
+
+from loguru import logger
+
+from src.main.python.benchmark.common import PetitionSigner, connect, create_test_material, start_test_server
+from src.main.python.certificate_utils import KEY_TYPES, generate_key_pair
+from src.main.python.framing import FRAMED, FRAMED_JSON_PREFACE, FrameReader, encode_frame
+from src.main.python.server import Server
+from src.main.python.ssl_context_utils import session_reused, tls_handshakes_total
+
+client_ids = itertools.count(1)
+
+
+def run(host: str, port: int, signer: PetitionSigner, connections: int, resume: bool) -> tuple:
+    """
+    Reconnects the given number of times and returns the mean handshake time and the resumed handshakes.
+    """
+    payloads = [encode_frame(json.dumps(signer.batch(next(client_ids), 1)).encode()) for _ in range(connections)]
+    session = None
+    elapsed = 0.0
+    resumed = 0
+    for payload in payloads:
+        start = time.perf_counter()
+        connection = connect(host, port, session if resume else None)
+        elapsed += time.perf_counter() - start
+        resumed += session_reused(connection)
+        connection.sendall(FRAMED_JSON_PREFACE + payload)
+        reader = FrameReader(mode=FRAMED)
+        while not reader.feed(connection.recv(65536)):
+            pass
+        # El ticket de TLS 1.3 llega después del handshake, así que la sesión se toma tras la respuesta
+        session = connection.get_session()
+        connection.shutdown()
+        connection.close()
+    return elapsed / connections, resumed
+
+
+def server_handshake_time(context: SSL.Context, handshakes: int) -> float:
+    """
+    Returns the mean seconds the server spends in a full handshake, without sockets or client work.
+    """
+    elapsed = 0.0
+    for _ in range(handshakes):
+        server = SSL.Connection(context, None)
+        server.set_accept_state()
+        client = SSL.Connection(SSL.Context(SSL.TLS_METHOD), None)
+        client.set_connect_state()
+        done = False
+        while not done:
+            try:
+                client.do_handshake()
+            except SSL.WantReadError:
+                pass
+            server.bio_write(client.bio_read(65536))
+            start = time.perf_counter()
+            try:
+                server.do_handshake()
+                done = True
+            except SSL.WantReadError:
+                pass
+            elapsed += time.perf_counter() - start
+            try:
+                client.bio_write(server.bio_read(65536))
+            except SSL.WantReadError:
+                pass
+    return elapsed / handshakes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=23600)
+    parser.add_argument("--connections", type=int, default=200)
+    args = parser.parse_args()
+
+    logger.remove()
+    signer = PetitionSigner()
+
+    print(f"{args.connections} connections per mode")
+    for port, key_type in enumerate(KEY_TYPES, args.port):
+        start = time.perf_counter()
+        generate_key_pair(key_type)
+        keygen = time.perf_counter() - start
+        server = start_test_server(Server, args.host, port, create_test_material(key_type))
+        print(f"{key_type} (key generation {keygen * 1000:.1f} ms, server side of a full handshake "
+              f"{server_handshake_time(server.ticket_keys.current, args.connections) * 1000:.2f} ms)")
+        for name, resume in (("full", False), ("resumed", True)):
+            mean, resumed = run(args.host, port, signer, args.connections, resume)
+            print(f"  {name:<10} {mean * 1000:8.2f} ms per handshake {1 / mean:10.1f} handshakes/s"
+                  f" {resumed:5d} resumed")
+        server.stop()
+    print("Server counters:", {kind: child.value for (kind,), child in tls_handshakes_total.children().items()})
@@ -0,0 +1,73 @@
+"""
+Latency of the per-client rate-limit queries on a large client_petitions table, with and without the
+(client_id, order_date) index.
+
+The queries are the ones check_client used to run on every message (a COUNT(*) and the latest three
+order dates of the client), which RateLimiter now only needs to warm up at startup.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from src.main.python.models import ClientPetition, db, init_database
+
+
+def check_client_queries(client_id: int) -> list:
+    """
+    Runs the queries check_client used to run for one message.
+    """
+    if ClientPetition.select().where(ClientPetition.client_id == client_id).count() > 3:
+        return [item.order_date for item in ClientPetition.select().where(ClientPetition.client_id == client_id)
+                .order_by(ClientPetition.order_date.desc()).limit(3)]
+    return []
+
+
+def measure(clients: int, samples: int) -> list:
+    """
+    Returns the latency in milliseconds of the queries for random clients.
+    """
+    latencies = []
+    for _ in range(samples):
+        client_id = random.randrange(clients)
+        start = time.perf_counter()
+        check_client_queries(client_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name: str, latencies: list) -> None:
+    latencies.sort()
+    print(f"{name:<15} p50 {latencies[len(latencies) // 2]:9.3f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:9.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        init_database(os.path.join(directory, "index.db"))
+        with db.connection_context():
+            db.create_tables([ClientPetition])
+            db.execute_sql('DROP INDEX "clientpetition_client_id_order_date"')
+            start = datetime(2024, 1, 1)
+            rows = [{'client_id': i % args.clients, 'name_material': 'towels', 'amount': 1,
+                     'order_date': start + timedelta(minutes=i)} for i in range(args.rows)]
+            ClientPetition.insert_batch(rows)
+            del rows
+            print(f"{args.rows} petitions of {args.clients} clients")
+
+            report("without index", measure(args.clients, args.samples))
+            db.execute(ClientPetition.index(ClientPetition.client_id, ClientPetition.order_date))
+            report("with index", measure(args.clients, args.samples))
+
+            warm_start = time.perf_counter()
+            warmed = sum(1 for _ in ClientPetition.recent_order_dates(4))
+            print(f"rate limiter warm-up: {warmed} order dates in {time.perf_counter() - warm_start:.2f} s")
+        db.close_all()
@@ -0,0 +1,228 @@
+"""
+Load generator for the petition server.
+
+Opens --connections concurrent TLS connections to a running server (python run_server.py <host> <port>)
+and sends signed batches of --batch-size petitions over each of them, at --rate batches per second in
+total (0 sends as fast as the server answers), for --duration seconds. With --reconnect every batch
+uses a new connection, as the clients do.
+
+Every batch gets a client id of its own, so the rate limiter only rejects batches when --clients
+limits the number of distinct client ids. --invalid-ratio sends that fraction of the batches with a
+broken signature.
+
+With --codec msgpack the batches are sent as MessagePack, with the signatures and the public key as
+raw bytes.
+
+Reports the throughput, the latency percentiles of the answered batches and the errors by kind.
+"""
+import argparse
+import collections
+import itertools
+import random
+import threading
+import time
+
+from OpenSSL import SSL
+from loguru import logger
+
+from src.main.python.benchmark.common import CODEC_NAMES, PetitionSigner, binary_petition, client_codec, connect, \
+    start_test_server
+from src.main.python.framing import FRAMED, PREFACE, FrameReader, encode_frame
+
+# Fragmentos de los mensajes de error del servidor que identifican cada tipo de error
+ERROR_KINDS = (
+    ("rate_limited", "Too many requests"),
+    ("signature", "signature verification failed"),
+    ("replay", "replayed petition"),
+    ("busy", "server busy"),
+)
+
+
+class LoadGenerator:
+    """
+    Sends signed petition batches to the server from several connections at once.
+
+    The petitions of a batch are signed once: the signature only covers the order date, so every
+    batch reuses them with its own client id.
+
+    Attributes:
+        latencies (list): The seconds from sending each answered batch to receiving its response.
+        outcomes (collections.Counter): The number of batches by outcome: ok or the kind of error.
+    """
+
+    def __init__(self, host: str, port: int, batch_size: int, clients: int = 0, invalid_ratio: float = 0.0,
+                 reconnect: bool = False, codec: str = "json") -> None:
+        """
+        Initializes the LoadGenerator.
+
+        Args:
+            host (str): Host IP address of the server.
+            port (int): Port number of the server.
+            batch_size (int): The number of petitions of every batch.
+            clients (int, optional): The number of distinct client ids, 0 for a new one per batch.
+            invalid_ratio (float, optional): The fraction of batches sent with a broken signature.
+            reconnect (bool, optional): Open a new connection for every batch.
+            codec (str, optional): The codec of the batches, "json" or "msgpack".
+        """
+        self.host = host
+        self.port = port
+        self.clients = clients
+        self.invalid_ratio = invalid_ratio
+        self.reconnect = reconnect
+        self.codec = client_codec(codec)
+        self.template = PetitionSigner().batch(0, batch_size)
+        if self.codec.binary:
+            self.template = [binary_petition(petition) for petition in self.template]
+        self.client_ids = itertools.count(1 + random.randrange(1 << 30))
+        self.latencies = []
+        self.outcomes = collections.Counter()
+        self._lock = threading.Lock()
+
+    def payload(self) -> bytes:
+        """
+        Builds the frame of the next batch.
+        """
+        client_id = next(self.client_ids)
+        if self.clients:
+            client_id = client_id % self.clients + 1
+        batch = [dict(petition, clientId=str(client_id)) for petition in self.template]
+        if random.random() < self.invalid_ratio:
+            batch[0]["orderDate"] = "2000-01-01 00:00:00"  # La firma ya no corresponde a la fecha
+        return encode_frame(self.codec.dumps(batch))
+
+    def record(self, outcome: str, latency: float = None) -> None:
+        with self._lock:
+            self.outcomes[outcome] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def worker(self, interval: float, deadline: float) -> None:
+        """
+        Sends batches every interval seconds until the deadline.
+        """
+        connection = None
+        reader = None
+        next_send = time.perf_counter()
+        while time.perf_counter() < deadline:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_send += interval
+            try:
+                if connection is None:
+                    connection = connect(self.host, self.port)
+                    connection.sendall(PREFACE + self.codec.codec_id)
+                    reader = FrameReader(mode=FRAMED, codec=self.codec)
+                payload = self.payload()
+                start = time.perf_counter()
+                connection.sendall(payload)
+                responses = []
+                while not responses:
+                    data = connection.recv(65536)
+                    if not data:
+                        raise ConnectionError("Connection closed by the server")
+                    responses = reader.feed(data)
+                latency = time.perf_counter() - start
+                outcome = classify(self.codec.loads(responses[0]))
+                self.record(outcome, latency)
+            except (SSL.Error, OSError) as e:
+                self.record("ssl" if isinstance(e, SSL.Error) else "connection")
+                connection = close(connection)
+                continue
+            if self.reconnect or outcome != "ok":  # El servidor cierra la conexión tras un error
+                connection = close(connection)
+        close(connection)
+
+    def run(self, connections: int, rate: float, duration: float) -> float:
+        """
+        Runs the workers and returns the elapsed seconds.
+
+        Args:
+            connections (int): The number of concurrent connections.
+            rate (float): The total batches per second, 0 for as fast as possible.
+            duration (float): The seconds to send batches for.
+
+        Returns:
+            float: The elapsed seconds.
+        """
+        interval = connections / rate if rate else 0.0
+        start = time.perf_counter()
+        deadline = start + duration
+        workers = [threading.Thread(target=self.worker, args=(interval, deadline), daemon=True)
+                   for _ in range(connections)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - start
+
+
+def classify(response: dict) -> str:
+    """
+    Returns the outcome of a batch from the response of the server.
+    """
+    if response.get("status") == "SUCCESS":
+        return "ok"
+    message = response.get("message", "")
+    for kind, fragment in ERROR_KINDS:
+        if fragment.lower() in message.lower():
+            return kind
+    return "other"
+
+
+def close(connection: SSL.Connection) -> None:
+    if connection is not None:
+        try:
+            connection.shutdown()
+        except (SSL.Error, OSError):
+            pass
+        connection.close()
+    return None
+
+
+def report(generator: LoadGenerator, elapsed: float, batch_size: int) -> None:
+    latencies = sorted(latency * 1000 for latency in generator.latencies)
+    ok = generator.outcomes["ok"]
+    print(f"Duration       {elapsed:10.1f} s")
+    print(f"Batches ok     {ok:10d}   {ok / elapsed:10.1f} batches/s   {ok * batch_size / elapsed:10.1f} petitions/s")
+    if latencies:
+        print("Latency (ms)   " + "   ".join(f"p{int(q * 100)} {latencies[max(0, int(len(latencies) * q) - 1)]:.2f}"
+                                            for q in (0.5, 0.95, 0.99)) + f"   max {latencies[-1]:.2f}")
+    errors = {outcome: count for outcome, count in generator.outcomes.items() if outcome != "ok"}
+    print(f"Errors         {sum(errors.values()):10d}   " + "   ".join(f"{kind} {count}"
+                                                                       for kind, count in sorted(errors.items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=0, help="total batches per second, 0 for no limit")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=0, help="distinct client ids, 0 for one per batch")
+    parser.add_argument("--invalid-ratio", type=float, default=0.0)
+    parser.add_argument("--reconnect", action="store_true", help="open a new connection for every batch")
+    parser.add_argument("--codec", choices=CODEC_NAMES, default="json")
+    parser.add_argument("--spawn", choices=("threaded", "async"),
+                        help="start a server of this mode in this process instead of using a running one")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        logger.remove()
+        if args.spawn == "async":
+            from src.main.python.async_server import AsyncServer as server_class
+        else:
+            from src.main.python.server import Server as server_class
+        server = start_test_server(server_class, args.host, args.port)
+
+    generator = LoadGenerator(args.host, args.port, args.batch_size, args.clients, args.invalid_ratio,
+                              args.reconnect, args.codec)
+    elapsed = generator.run(args.connections, args.rate, args.duration)
+    if server is not None:
+        server.stop()
+    print(f"{args.connections} connections, {args.codec} batches of {args.batch_size}"
+          + (f", {args.rate:g} batches/s" if args.rate else "") + (", reconnecting" if args.reconnect else ""))
+    report(generator, elapsed, args.batch_size)
@@ -0,0 +1,92 @@
+"""
+Cost of logging on the request thread at a steady message rate.
+
+Every simulated request logs its received payload and one SUCCESS line, as handle_client does.
+Compares the old configuration (the default stderr handler of loguru plus three synchronous sinks on
+the same file, one per level) with the configuration left by load_logger. Both start from the
+handlers loguru has when the server starts. Run it with stderr redirected, as a server usually is:
+
+    python -m src.main.python.benchmark.logging_benchmark 2>/dev/null
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from loguru import logger
+
+from src.main.python.benchmark.common import PetitionSigner
+from src.main.python.logger import LOG_FORMAT, log_payload, load_logger, stop_logger
+
+
+def old_load_logger(path: str) -> None:
+    logger.add(path, format=LOG_FORMAT, level="ERROR")
+    logger.add(path, format=LOG_FORMAT, level="SUCCESS")
+    logger.add(path, format=LOG_FORMAT, level="INFO")
+
+
+def run(messages: int, rate: int, payload: str, log_request) -> list:
+    """
+    Logs the requests at the given rate and returns the time spent logging each one, in microseconds.
+    """
+    interval = 1 / rate
+    durations = []
+    next_request = time.perf_counter()
+    for _ in range(messages):
+        start = time.perf_counter()
+        log_request(payload)
+        durations.append((time.perf_counter() - start) * 1e6)
+        next_request += interval
+        delay = next_request - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    return sorted(durations)
+
+
+def count_lines(directory: str) -> int:
+    total = 0
+    for file in os.listdir(directory):
+        with open(os.path.join(directory, file), "rb") as log_file:
+            total += sum(1 for _ in log_file)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rate", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=4)
+    args = parser.parse_args()
+
+    signer = PetitionSigner()
+    payload = json.dumps(signer.batch(1, args.batch_size))
+
+    def old_request(received_message: str) -> None:
+        logger.info(f"Received message: {received_message}")
+        logger.success("Digital Sign verified and Delivery Petition has been saved succesfully.")
+
+    def new_request(received_message: str) -> None:
+        log_payload(received_message)
+        logger.success("Digital Sign verified and Delivery Petition has been saved succesfully.")
+
+    for name, configure, log_request in (("stderr + 3 sinks", old_load_logger, old_request),
+                                         ("one queued sink", load_logger, new_request)):
+        with tempfile.TemporaryDirectory() as directory:
+            # Los manejadores con los que arranca el servidor: el de stderr que loguru añade por defecto
+            logger.remove()
+            logger.add(sys.stderr)
+            if configure is old_load_logger:
+                configure(os.path.join(directory, "log.txt"))
+            else:
+                configure(directory)
+            durations = run(args.messages, args.rate, payload, log_request)
+            if configure is old_load_logger:
+                logger.remove()
+            else:
+                stop_logger()
+            lines = count_lines(directory)
+        print(f"{name:<18} mean {sum(durations) / len(durations):7.1f} us   "
+              f"p99 {durations[int(len(durations) * 0.99) - 1]:7.1f} us   "
+              f"{lines / args.messages:.1f} lines per request")
@@ -0,0 +1,84 @@
+"""
+Per-connection throughput of the petition server.
+
+Compares, over a single connection:
+
+- paced: the old behaviour, one second of sleep after every response.
+- lockstep: send a batch and wait for its response before sending the next one.
+- pipelined: keep up to --depth framed batches in flight and read the responses in order.
+"""
+import argparse
+import itertools
+import json
+import time
+
+from loguru import logger
+
+from src.main.python.benchmark.common import PetitionSigner, connect, start_test_server
+from src.main.python.codec import json_codec
+from src.main.python.framing import FRAMED, FRAMED_JSON_PREFACE, FrameReader, encode_frame
+from src.main.python.server import Server
+
+client_ids = itertools.count(1)
+
+
+class PacedServer(Server):
+    """
+    Server that stalls one second after every batch, as handle_client used to do.
+    """
+
+    def process_message(self, received_message: bytes, codec=json_codec):
+        message = super().process_message(received_message, codec)
+        time.sleep(1)
+        return message
+
+
+def run(host: str, port: int, signer: PetitionSigner, batches: int, batch_size: int, depth: int) -> float:
+    """
+    Sends the batches over one framed connection and returns the batches per second.
+    """
+    payloads = [encode_frame(json.dumps(signer.batch(next(client_ids), batch_size)).encode()) for _ in range(batches)]
+    connection = connect(host, port)
+    reader = FrameReader(mode=FRAMED)
+    connection.sendall(FRAMED_JSON_PREFACE)
+    responses = []
+    sent = 0
+    start = time.perf_counter()
+    while len(responses) < batches:
+        while sent < batches and sent - len(responses) < depth:
+            connection.sendall(payloads[sent])
+            sent += 1
+        responses += reader.feed(connection.recv(65536))
+    elapsed = time.perf_counter() - start
+    connection.shutdown()
+    connection.close()
+    errors = [response for response in responses if b'"SUCCESS"' not in response]
+    if errors:
+        raise RuntimeError(f"{len(errors)} batches failed: {errors[0]}")
+    return batches / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=23500)
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--depth", type=int, default=16)
+    args = parser.parse_args()
+
+    logger.remove()
+    signer = PetitionSigner()
+    servers = [start_test_server(PacedServer, args.host, args.port), start_test_server(Server, args.host, args.port + 1)]
+
+    results = [
+        ("paced (old 1 s stall)", run(args.host, args.port, signer, 3, args.batch_size, 1)),
+        ("lockstep", run(args.host, args.port + 1, signer, args.batches, args.batch_size, 1)),
+        (f"pipelined (depth {args.depth})", run(args.host, args.port + 1, signer, args.batches, args.batch_size,
+                                               args.depth)),
+    ]
+    for server in servers:
+        server.stop()
+    print(f"Batches of {args.batch_size} petitions over one connection")
+    for name, throughput in results:
+        print(f"{name:<25} {throughput:10.1f} batches/s")
@@ -0,0 +1,79 @@
+"""
+Cold-start time of the server.
+
+Measures, for the configured keystore:
+
+- the time to build the SSL context decoding the Java KeyStore, and from the PEM cache.
+- the time from launching run_server.py until it accepts TCP connections, with and without the cache.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from loguru import logger
+
+from src.main.python.server import Server, server_alias
+from src.main.python.ssl_context_utils import jks_file_to_context, pem_cache_path
+
+
+def remove_cache() -> None:
+    if os.path.exists(pem_cache_path):
+        os.remove(pem_cache_path)
+
+
+def time_context(runs: int, cold: bool) -> float:
+    """
+    Returns the mean seconds to build the SSL context.
+    """
+    elapsed = 0.0
+    for _ in range(runs):
+        if cold:
+            remove_cache()
+        start = time.perf_counter()
+        jks_file_to_context(server_alias)
+        elapsed += time.perf_counter() - start
+    return elapsed / runs
+
+
+def time_to_listening(host: str, port: int, cold: bool) -> float:
+    """
+    Launches the server and returns the seconds until it accepts TCP connections.
+    """
+    if cold:
+        remove_cache()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "run_server.py", host, str(port)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError("The server exited before listening")
+            try:
+                socket.create_connection((host, port), timeout=1).close()
+                return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=23700)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    logger.remove()
+    Server(args.host, args.port).load_certificate()  # Crea el keystore si todavía no existe
+
+    print(f"SSL context, mean of {args.runs} runs")
+    print(f"{'keystore decoded':<20} {time_context(args.runs, True) * 1000:10.1f} ms")
+    print(f"{'PEM cache':<20} {time_context(args.runs, False) * 1000:10.1f} ms")
+    print("Time to listening")
+    for name, cold in (("keystore decoded", True), ("PEM cache", False)):
+        print(f"{name:<20} {time_to_listening(args.host, args.port, cold) * 1000:10.1f} ms")
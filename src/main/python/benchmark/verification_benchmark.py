@@ -0,0 +1,46 @@
+"""
+Signature verification throughput of SignatureVerifier with different numbers of worker processes,
+and of the verification cache when the same signatures are sent again.
+"""
+import argparse
+import base64
+import os
+import time
+from datetime import datetime, timedelta
+
+from src.main.python.benchmark.common import ORDER_DATE_FORMAT, PetitionSigner
+from src.main.python.signature_verifier import SignatureVerifier
+from src.main.python.verification_cache import VerificationCache
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--signatures", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    signer = PetitionSigner()
+    petitions = [signer.petition(1, datetime(2024, 1, 1) + timedelta(minutes=i)) for i in range(args.signatures)]
+    items = [(petition["publicKey"], datetime.strptime(petition["orderDate"], ORDER_DATE_FORMAT),
+              base64.b64decode(petition["digitalSignature"])) for petition in petitions]
+    batches = [items[start:start + args.batch_size] for start in range(0, len(items), args.batch_size)]
+
+    process_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    for processes in process_counts:
+        verifier = SignatureVerifier(processes=processes, cache=None)
+        verifier.verify_batch(batches[0])  # Arranca el pool y llena las cachés de claves
+        start = time.perf_counter()
+        for batch in batches:
+            assert all(verifier.verify_batch(batch))
+        elapsed = time.perf_counter() - start
+        verifier.shutdown()
+        print(f"{processes:>3} processes: {args.signatures / elapsed:10.0f} signatures/s")
+
+    # Un reintento vuelve a enviar las mismas firmas: la segunda pasada sale de la caché
+    verifier = SignatureVerifier(processes=1, cache=VerificationCache(max_size=args.signatures))
+    for batch in batches:
+        verifier.verify_batch(batch)
+    start = time.perf_counter()
+    for batch in batches:
+        assert all(verifier.verify_batch(batch))
+    elapsed = time.perf_counter() - start
+    print(f"     cached: {args.signatures / elapsed:10.0f} signatures/s")
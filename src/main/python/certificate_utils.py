@@ -1,27 +1,42 @@
 import os
-from configparser import ConfigParser
 
 import OpenSSL
-import jks
 from OpenSSL import crypto
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
 from loguru import logger
 
+from src.main.python.settings import configuration
+
 # CONSTANTS
 ASN1 = OpenSSL.crypto.FILETYPE_ASN1
-configuration = ConfigParser()
-configuration.read("configuration.ini")
 current_directory = os.path.dirname(os.path.abspath(__file__))
 keystore_password = configuration.get("KEYSTORE", "password")
 keystore_path = os.path.join(current_directory, configuration.get("KEYSTORE", "path"))
+key_type = configuration.get("SERVER", "key_type")
+
+KEY_TYPES = ("rsa", "ecdsa")
 
 
-def generate_key_pair() -> OpenSSL.crypto.PKey:
+def generate_key_pair(key_type: str = key_type) -> OpenSSL.crypto.PKey:
     """
-    Generates a new RSA key pair with a key length of 2048 bits.
+    Generates a new key pair: RSA with a key length of 2048 bits, or ECDSA on the P-256 curve.
+
+    ECDSA keys are generated and used in handshakes much faster than RSA ones.
+
+    Args:
+        key_type (str, optional): "rsa" or "ecdsa". Defaults to the configured one.
 
     Returns:
         OpenSSL.crypto.PKey: The generated key pair.
+
+    Raises:
+        ValueError: If the key type is unknown.
     """
+    if key_type == "ecdsa":
+        return crypto.PKey.from_cryptography_key(ec.generate_private_key(ec.SECP256R1()))
+    if key_type != "rsa":
+        raise ValueError(f"Unknown key type: {key_type}, expected one of {KEY_TYPES}")
     key = crypto.PKey()
     key.generate_key(crypto.TYPE_RSA, 2048)
     return key
@@ -61,14 +76,19 @@ def save_key_and_certificate_with_alias(key: OpenSSL.crypto.PKey, cert: OpenSSL.
     Raises:
         Exception: If there is an error saving the key and certificate.
     """
+    import jks  # pyjks tarda en importarse y solo hace falta al crear el keystore
+
     try:
         if not os.path.exists(keystore_path):
             keystore = jks.KeyStore.new("jks", [])
         else:
             keystore = jks.KeyStore.load(keystore_path, keystore_password)
         dumped_cert = OpenSSL.crypto.dump_certificate(OpenSSL.crypto.FILETYPE_ASN1, cert)
-        dumped_key = OpenSSL.crypto.dump_privatekey(OpenSSL.crypto.FILETYPE_ASN1, key)
-        private_key = jks.PrivateKeyEntry.new(alias, [dumped_cert], dumped_key, 'rsa_raw')
+        # PKCS#8 guarda el algoritmo de la clave, así que sirve tanto para RSA como para ECDSA
+        dumped_key = key.to_cryptography_key().private_bytes(serialization.Encoding.DER,
+                                                             serialization.PrivateFormat.PKCS8,
+                                                             serialization.NoEncryption())
+        private_key = jks.PrivateKeyEntry.new(alias, [dumped_cert], dumped_key, 'pkcs8')
         keystore.entries[alias] = private_key
 
         logger.info(f"Saving key and certificate with alias '{keystore_path}' to keystore...")
@@ -0,0 +1,174 @@
+import json
+
+from src.main.python.settings import configuration
+
+try:
+    import orjson
+except ImportError:  # Sin orjson se usa el módulo json de la biblioteca estándar
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Sin msgpack los clientes solo pueden usar JSON
+    msgpack = None
+
+# CONSTANTS
+json_library = configuration.get("CODEC", "json_library")
+msgpack_enabled = configuration.getboolean("CODEC", "msgpack")
+
+# Identificadores de códec enviados tras el preámbulo de las conexiones con tramas
+JSON_CODEC = b"J"
+MSGPACK_CODEC = b"M"
+
+
+class UnsupportedCodecError(ValueError):
+    """
+    Raised when a client asks for a codec that this server does not provide.
+    """
+
+
+class JSONCodec:
+    """
+    Encodes the messages as UTF-8 JSON.
+
+    orjson is used when it is installed, since it parses and serializes several times faster than
+    the json module, which is used otherwise. Both read and write the same documents.
+
+    Attributes:
+        codec_id (bytes): The identifier sent after the framing preface.
+        name (str): The name of the codec and the library behind it.
+        binary (bool): Whether raw bytes can be sent. JSON carries them in base64.
+    """
+    codec_id = JSON_CODEC
+    binary = False
+
+    def __init__(self, library: str = json_library) -> None:
+        """
+        Initializes the JSONCodec.
+
+        Args:
+            library (str, optional): "orjson", "json", or "auto" for orjson when it is installed.
+
+        Raises:
+            ValueError: If the library is unknown, or orjson is asked for and not installed.
+        """
+        if library == "auto":
+            library = "json" if orjson is None else "orjson"
+        if library == "orjson" and orjson is None:
+            raise ValueError("orjson is not installed")
+        if library not in ("orjson", "json"):
+            raise ValueError(f"Unknown JSON library: {library}")
+        self.name = f"json ({library})"
+        self._orjson = library == "orjson"
+
+    def dumps(self, data) -> bytes:
+        """
+        Encodes a message.
+
+        Args:
+            data: The message, made of dicts, lists, strings, numbers, booleans and None.
+
+        Returns:
+            bytes: The encoded message.
+        """
+        if self._orjson:
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    def loads(self, payload):
+        """
+        Decodes a message.
+
+        Args:
+            payload (bytes | str): The encoded message.
+
+        Returns:
+            The decoded message.
+
+        Raises:
+            ValueError: If the payload is not valid JSON.
+        """
+        if self._orjson:
+            return orjson.loads(payload)
+        return json.loads(payload)
+
+
+class MsgPackCodec:
+    """
+    Encodes the messages as MessagePack.
+
+    It is more compact than JSON and lets the clients send the digital signature and the public key
+    as raw bytes instead of base64.
+
+    Attributes:
+        codec_id (bytes): The identifier sent after the framing preface.
+        name (str): The name of the codec.
+        binary (bool): Whether raw bytes can be sent.
+    """
+    codec_id = MSGPACK_CODEC
+    name = "msgpack"
+    binary = True
+
+    def __init__(self) -> None:
+        """
+        Initializes the MsgPackCodec.
+
+        Raises:
+            ValueError: If msgpack is not installed.
+        """
+        if msgpack is None:
+            raise ValueError("msgpack is not installed")
+
+    def dumps(self, data) -> bytes:
+        """
+        Encodes a message.
+
+        Args:
+            data: The message, made of dicts, lists, strings, bytes, numbers, booleans and None.
+
+        Returns:
+            bytes: The encoded message.
+        """
+        return msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, payload: bytes):
+        """
+        Decodes a message.
+
+        Args:
+            payload (bytes): The encoded message.
+
+        Returns:
+            The decoded message.
+
+        Raises:
+            ValueError: If the payload is not valid MessagePack.
+        """
+        return msgpack.unpackb(payload, raw=False)
+
+
+json_codec = JSONCodec()
+
+# Códecs que el servidor acepta, por identificador
+CODECS = {JSON_CODEC: json_codec}
+if msgpack_enabled and msgpack is not None:
+    CODECS[MSGPACK_CODEC] = MsgPackCodec()
+
+
+def get_codec(codec_id: bytes):
+    """
+    Returns the codec with the given identifier.
+
+    Args:
+        codec_id (bytes): The identifier sent after the framing preface.
+
+    Returns:
+        JSONCodec | MsgPackCodec: The codec.
+
+    Raises:
+        UnsupportedCodecError: If the codec is unknown, disabled or its library is not installed.
+    """
+    try:
+        return CODECS[codec_id]
+    except KeyError:
+        raise UnsupportedCodecError(f"Unsupported codec: {codec_id!r}") from None
@@ -0,0 +1,218 @@
+import re
+import struct
+
+from src.main.python.codec import JSON_CODEC, MSGPACK_CODEC, UnsupportedCodecError, get_codec, json_codec
+from src.main.python.settings import configuration
+
+# CONSTANTS
+max_frame_size = configuration.getint("FRAMING", "max_frame_size")
+
+# Una conexión con tramas empieza con b"SHF" seguido del identificador del códec
+PREFACE = b"SHF"
+FRAMED_JSON_PREFACE = PREFACE + JSON_CODEC
+FRAMED_MSGPACK_PREFACE = PREFACE + MSGPACK_CODEC
+HEADER = struct.Struct("!I")
+
+LEGACY = "legacy"
+FRAMED = "framed"
+
+_STRUCTURE = re.compile(rb'["\[\]{}]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_WHITESPACE = b" \t\r\n"
+
+
+class FramingError(ValueError):
+    """
+    Raised when the received bytes can not be split into messages.
+    """
+
+
+def encode_frame(payload: bytes) -> bytes:
+    """
+    Prefixes the payload with its length.
+
+    Args:
+        payload (bytes): The payload of the frame.
+
+    Returns:
+        bytes: The length header followed by the payload.
+    """
+    return HEADER.pack(len(payload)) + payload
+
+
+class FrameReader:
+    """
+    Reassembles the messages of one connection from the chunks returned by recv.
+
+    Two wire formats are accepted and told apart from the first bytes of the connection:
+
+    - Framed: the client opens with PREFACE and the identifier of its codec, as in FRAMED_JSON_PREFACE
+      or FRAMED_MSGPACK_PREFACE, and then sends every message as a 4-byte big-endian length followed
+      by the payload. Replies are framed and encoded the same way.
+    - Legacy: the client sends bare JSON documents. Messages are split at the end of every top-level
+      JSON array or object and replies are sent unframed, as older clients expect.
+
+    Attributes:
+        mode (str): LEGACY or FRAMED once detected, None before.
+        codec (JSONCodec | MsgPackCodec): The codec of the messages. JSON until the client asks for another.
+    """
+
+    def __init__(self, mode: str = None, max_size: int = max_frame_size, codec=json_codec) -> None:
+        """
+        Initializes the FrameReader.
+
+        Args:
+            mode (str, optional): Skips the detection when the format is already known, as on the client side.
+            max_size (int, optional): The maximum size of a message in bytes.
+            codec (JSONCodec | MsgPackCodec, optional): The codec of the messages when the mode is given.
+        """
+        self.mode = mode
+        self.codec = codec
+        self.max_size = max_size
+        self._buffer = bytearray()
+        self._scan = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, data: bytes) -> list:
+        """
+        Adds the received bytes and returns the messages completed by them.
+
+        Args:
+            data (bytes): The bytes returned by recv.
+
+        Returns:
+            list: The complete messages, in the order they were sent.
+
+        Raises:
+            FramingError: If a message is malformed or larger than the maximum size.
+        """
+        self._buffer += data
+        if self.mode is None and not self._detect():
+            return []
+        if self.mode == FRAMED:
+            return self._split_framed()
+        return self._split_legacy()
+
+    def encode(self, payload: bytes) -> bytes:
+        """
+        Encodes a reply in the format used by the client.
+
+        Args:
+            payload (bytes): The reply.
+
+        Returns:
+            bytes: The bytes to send.
+        """
+        if self.mode == FRAMED:
+            return encode_frame(payload)
+        return payload
+
+    def encode_message(self, message: dict) -> bytes:
+        """
+        Encodes a reply with the codec of the connection and in the format used by the client.
+
+        Args:
+            message (dict): The reply, as returned by JSONResponse.to_dict.
+
+        Returns:
+            bytes: The bytes to send.
+        """
+        return self.encode(self.codec.dumps(message))
+
+    def _detect(self) -> bool:
+        """
+        Detects the wire format from the first bytes of the connection.
+
+        Returns:
+            bool: True once the format is known, False if more bytes are needed.
+        """
+        preface = bytes(self._buffer[:len(FRAMED_JSON_PREFACE)])
+        if preface.startswith(PREFACE):
+            if len(preface) < len(FRAMED_JSON_PREFACE):
+                return False
+            try:
+                self.codec = get_codec(preface[len(PREFACE):])
+            except UnsupportedCodecError as e:
+                raise FramingError(str(e))
+            self.mode = FRAMED
+            del self._buffer[:len(FRAMED_JSON_PREFACE)]
+            return True
+        if PREFACE.startswith(preface):
+            return False
+        self.mode = LEGACY
+        return True
+
+    def _split_framed(self) -> list:
+        """
+        Splits the buffer into length-prefixed frames.
+
+        Returns:
+            list: The complete frames.
+        """
+        messages = []
+        while len(self._buffer) >= HEADER.size:
+            (length,) = HEADER.unpack_from(self._buffer)
+            if length > self.max_size:
+                raise FramingError(f"Frame of {length} bytes exceeds the maximum of {self.max_size} bytes")
+            end = HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            messages.append(bytes(self._buffer[HEADER.size:end]))
+            del self._buffer[:end]
+        return messages
+
+    def _split_legacy(self) -> list:
+        """
+        Splits the buffer at the end of every top-level JSON array or object.
+
+        The scan resumes where the previous call stopped, so every byte is only scanned once.
+
+        Returns:
+            list: The complete JSON documents.
+        """
+        messages = []
+        buffer = self._buffer
+        i = self._scan
+        while i < len(buffer):
+            if self._escape:
+                self._escape = False
+                i += 1
+                continue
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, i)
+                if match is None:
+                    i = len(buffer)
+                    break
+                i = match.start()
+                if buffer[i] == ord("\\"):
+                    self._escape = True
+                else:
+                    self._in_string = False
+                i += 1
+                continue
+            match = _STRUCTURE.search(buffer, i)
+            if match is None:
+                i = len(buffer)
+                break
+            i = match.start()
+            char = buffer[i]
+            if char == ord('"'):
+                self._in_string = True
+            elif char in b"[{":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth < 0:
+                    raise FramingError("Unbalanced JSON message")
+                if self._depth == 0:
+                    messages.append(bytes(buffer[:i + 1]).strip(_WHITESPACE))
+                    del buffer[:i + 1]
+                    i = 0
+                    continue
+            i += 1
+        self._scan = i
+        if len(buffer) > self.max_size:
+            raise FramingError(f"Message exceeds the maximum of {self.max_size} bytes")
+        return messages
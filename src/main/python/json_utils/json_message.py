@@ -1,5 +1,5 @@
 # json_message.py
-import json
+from src.main.python.codec import json_codec
 
 
 class JSONMessage:
@@ -42,7 +42,7 @@ class JSONMessage:
             str: The JSON-formatted string.
         """
 
-        return json.dumps(self.to_dict(), ensure_ascii=False)
+        return json_codec.dumps(self.to_dict()).decode("utf-8")
 
     @staticmethod
     def from_json(json_string: str) -> 'JSONMessage':
@@ -55,7 +55,7 @@ class JSONMessage:
         Returns:
             JSONMessage: The JSONMessage object.
         """
-        data = json.loads(json_string)
+        data = json_codec.loads(json_string)
         return JSONMessage(data['client_id'], data['name_material'], data['amount'], data['digital_signature'], data['order_date'])
 
     @staticmethod
@@ -69,7 +69,7 @@ class JSONMessage:
         Returns:
             JSONMessage: The JSONMessage object.
         """
-        data = json.loads(json_string)
+        data = json_codec.loads(json_string)
         res = []
         print(data)
         for value in data:
@@ -1,5 +1,5 @@
 # json_response.py
-import json
+from src.main.python.codec import json_codec
 
 class JSONResponse:
     def __init__(self, status: str, message: str) -> None:
@@ -28,7 +28,7 @@ class JSONResponse:
         Returns:
             str: The JSON-formatted string.
         """
-        return json.dumps(self.to_dict(), ensure_ascii=False)
+        return json_codec.dumps(self.to_dict()).decode("utf-8")
 
     @staticmethod
     def from_json(json_string: str) -> 'JSONResponse':
@@ -41,5 +41,5 @@ class JSONResponse:
         Returns:
             JSONResponse: The JSONResponse object.
         """
-        data = json.loads(json_string)
+        data = json_codec.loads(json_string)
         return JSONResponse(data['status'], data['message'])
\ No newline at end of file
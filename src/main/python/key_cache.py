@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+
+from Cryptodome.PublicKey import RSA
+from Cryptodome.Signature import pkcs1_15
+
+from src.main.python.metrics import registry
+from src.main.python.settings import configuration
+
+# CONSTANTS
+key_cache_size = configuration.getint("SIGNATURE", "key_cache_size")
+# Resultado de la métrica y nombre del contador en stats()
+KEY_CACHE_RESULTS = (("hit", "hits"), ("miss", "misses"), ("eviction", "evictions"))
+
+public_key_cache_total = registry.counter("securehotel_public_key_cache_total",
+                                          "Public key cache lookups and evictions, by result.", ("result",))
+
+
+class PublicKeyCache:
+    """
+    Bounded LRU cache of imported client public keys and their signature verifiers.
+
+    A client sends the same public key in every petition, and importing it (PEM and ASN.1 parsing)
+    costs about as much as verifying the signature. The cache is keyed by the key as sent by the
+    client: a base64 string, or the raw DER bytes with a binary codec. When it is full, the least
+    recently used key is evicted.
+
+    The lookups and evictions are also counted in the metrics of the process.
+
+    Attributes:
+        max_size (int): The maximum number of keys kept.
+        hits (int): Lookups served from the cache.
+        misses (int): Lookups that had to import the key.
+        evictions (int): Keys evicted to make room for new ones.
+    """
+
+    def __init__(self, max_size: int = key_cache_size) -> None:
+        """
+        Initializes an empty PublicKeyCache.
+
+        Args:
+            max_size (int, optional): The maximum number of keys kept.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, public_key) -> tuple:
+        """
+        Returns the imported key and its verifier, importing the key on a miss.
+
+        Args:
+            public_key (str | bytes): The base64 DER public key sent by the client, or the DER bytes.
+
+        Returns:
+            tuple: The RSA.RsaKey and its pkcs1_15 verifier.
+
+        Raises:
+            ValueError: If the public key can not be imported.
+        """
+        with self._lock:
+            entry = self._entries.get(public_key)
+            if entry is not None:
+                self._entries.move_to_end(public_key)
+                self.hits += 1
+                public_key_cache_total.labels("hit").inc()
+                return entry
+            self.misses += 1
+        public_key_cache_total.labels("miss").inc()
+
+        # La importación se hace fuera del cerrojo para no bloquear al resto de hilos
+        key = RSA.import_key(public_key if isinstance(public_key, bytes) else convert_to_pem(public_key))
+        entry = (key, pkcs1_15.new(key))
+
+        with self._lock:
+            self._entries[public_key] = entry
+            self._entries.move_to_end(public_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+                public_key_cache_total.labels("eviction").inc()
+        return entry
+
+    def clear(self) -> None:
+        """
+        Removes every key and resets the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the size and the statistics of the cache.
+
+        Returns:
+            dict: The size, maximum size, hits, misses, evictions and hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+            }
+
+
+def record_lookups(counts: dict) -> None:
+    """
+    Adds the lookups and evictions of the public key cache of another process, such as a signature
+    verification worker, to the metrics of this one.
+
+    Args:
+        counts (dict): The hits, misses and evictions, with the names of PublicKeyCache.stats.
+    """
+    for result, name in KEY_CACHE_RESULTS:
+        if counts[name]:
+            public_key_cache_total.labels(result).inc(counts[name])
+
+
+def convert_to_pem(public_key_base64: str) -> str:
+    """
+    Wraps a base64 DER public key in a PEM envelope.
+
+    Args:
+        public_key_base64 (str): The base64 DER public key.
+
+    Returns:
+        str: The PEM public key.
+    """
+    return "-----BEGIN PUBLIC KEY-----\n" + public_key_base64 + "\n-----END PUBLIC KEY-----"
+
+
+public_key_cache = PublicKeyCache()
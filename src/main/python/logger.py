@@ -1,27 +1,143 @@
 import os
+import queue
+import random
+import threading
 from datetime import datetime
 
 from loguru import logger
 
+from src.main.python.settings import configuration
 
-def load_logger() -> None:
+# CONSTANTS
+log_level = configuration.get("LOGGING", "level")
+log_buffering = configuration.getint("LOGGING", "buffering")
+payload_sample_rate = configuration.getfloat("LOGGING", "payload_sample_rate")
+payload_max_chars = configuration.getint("LOGGING", "payload_max_chars")
+LOG_FORMAT = "{level} - {time} - {message}"
+
+sink = None
+sink_id = None
+
+
+class QueuedFileSink:
+    """
+    Loguru sink that writes the log lines from a background thread.
+
+    The thread that logs only puts the formatted line in a queue. The writer thread takes every line
+    that is waiting, writes them to the log file of the day with a single buffered write and flushes,
+    so the request threads never wait for the disk.
+
+    Attributes:
+        logs_dir (str): The directory of the log files.
+    """
+
+    def __init__(self, logs_dir: str, buffering: int = log_buffering, file_suffix: str = "") -> None:
+        """
+        Initializes the sink and starts its writer thread.
+
+        Args:
+            logs_dir (str): The directory of the log files.
+            buffering (int, optional): The size of the file buffer in bytes.
+            file_suffix (str, optional): Added to the name of the log files, so several processes do not share one.
+        """
+        self.logs_dir = logs_dir
+        self.buffering = buffering
+        self.file_suffix = file_suffix
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._file_date = None
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        self._queue.put(message)
+
+    def stop(self) -> None:
+        """
+        Writes the lines still queued and stops the writer thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        running = True
+        while running:
+            lines = [self._queue.get()]
+            # Se escriben de una vez todas las líneas que ya están en la cola
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in lines:
+                running = False
+                lines = [line for line in lines if line is not None]
+            if lines:
+                log_file = self._current_file()
+                log_file.write("".join(lines))
+                log_file.flush()
+        if self._file is not None:
+            self._file.close()
+
+    def _current_file(self):
+        # Un fichero por día: {fecha}_log{sufijo}.txt
+        current_date = datetime.now().strftime('%Y-%m-%d')
+        if current_date != self._file_date:
+            if self._file is not None:
+                self._file.close()
+            path = os.path.join(self.logs_dir, f'{current_date}_log{self.file_suffix}.txt')
+            self._file = open(path, "a", buffering=self.buffering, encoding="utf-8")
+            self._file_date = current_date
+        return self._file
+
+
+def load_logger(logs_dir: str = '../logs/', file_suffix: str = "") -> None:
     """
     Initializes the Logger.
 
+    Replaces the handlers of loguru, including its default synchronous one on stderr, with a single
+    QueuedFileSink for every level from the configured one up. Loguru levels are thresholds, so one
+    sink is enough and every line is written once. Calling it again does nothing.
+
     Args:
-        is_test (bool, optional): Indicates if the logger is used for testing purposes.
+        logs_dir (str, optional): The directory of the log files.
+        file_suffix (str, optional): Added to the name of the log files.
+    """
+    global sink, sink_id
+    if sink is not None:
+        return
+    # El manejador por defecto escribe en stderr de forma síncrona en el hilo de la petición
+    logger.remove()
+    sink = QueuedFileSink(logs_dir, file_suffix=file_suffix)
+    sink_id = logger.add(sink, format=LOG_FORMAT, level=log_level)
+
+
+def stop_logger() -> None:
+    """
+    Removes the sink added by load_logger, once every queued line has been written.
     """
-    # Get the current date or use a specific date for tests
-    current_date = datetime.now().strftime('%Y-%m-%d')
+    global sink, sink_id
+    if sink is None:
+        return
+    logger.remove(sink_id)
+    sink.stop()
+    sink = sink_id = None
+
 
-    # Create a file name with the date
-    log_file_name = f'{current_date}_log.txt'
-    log_file_path = os.path.join(
-        '../logs/', log_file_name)
+def log_payload(payload) -> None:
+    """
+    Logs a received payload at INFO level, sampled and truncated.
 
-    # Configure the Loguru logger
-    fmt = "{level} - {time} - {message}"
-    logger.add(log_file_path, rotation="1 day", format=fmt, level="ERROR")
-    logger.add(log_file_path, rotation="1 day", format=fmt, level="SUCCESS")
-    logger.add(log_file_path, rotation="1 day", format=fmt, level="INFO")
+    Only a payload_sample_rate fraction of the payloads is logged, and at most payload_max_chars
+    characters of each. Payloads received as bytes are only decoded when they are logged.
 
+    Args:
+        payload (str | bytes): The received payload.
+    """
+    if payload_sample_rate < 1.0 and random.random() >= payload_sample_rate:
+        return
+    if isinstance(payload, bytes):
+        payload = payload.decode("utf-8", "backslashreplace")
+    if len(payload) > payload_max_chars:
+        payload = f"{payload[:payload_max_chars]}... ({len(payload)} characters)"
+    logger.info(f"Received message: {payload}")
@@ -1,10 +1,25 @@
 import json
+import os
+import threading
+
+from src.main.python.metrics import registry
+
+file_cache_total = registry.counter("securehotel_file_cache_total", "Loads of managed files, by cache result.",
+                                    ("result",))
+
+# Contenido ya parseado de cada fichero, compartido por todos los managers del proceso
+_cache = {}
+_cache_lock = threading.Lock()
 
 
 class FileManager:
     """
     A class to manage files.
 
+    The parsed contents of the files are cached for the whole process, keyed by path, and parsed
+    again only when the inode, modification time or size of the file change. The cached data is
+    shared: callers must not modify what _load returns.
+
     Attributes:
         file_path (str): The path to the file storing messages.
     """
@@ -27,12 +42,7 @@ class FileManager:
         Returns:
             bool: True if the file exists, False otherwise.
         """
-        try:
-            with open(self.file_path, "r"):
-                pass
-            return True
-        except FileNotFoundError:
-            return False
+        return os.path.exists(self.file_path)
 
     def _create_file(self) -> None:
         """
@@ -43,10 +53,44 @@ class FileManager:
 
     def _load(self) -> list:
         """
-        Load data from the file.
+        Load data from the file, or from the cache if the file has not changed.
 
         Returns:
             list: List of dictionaries containing usernames and messages.
         """
-        with open(self.file_path, "r") as file:
-            return json.load(file)
\ No newline at end of file
+        path = os.path.abspath(self.file_path)
+        stat = os.stat(path)
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == version:
+            file_cache_total.labels("hit").inc()
+            return cached[1]
+
+        file_cache_total.labels("miss").inc()
+        with open(path, "rb") as file:
+            data = json.load(file)
+        with _cache_lock:
+            _cache[path] = (version, data)
+        return data
+
+
+def cache_stats() -> dict:
+    """
+    Returns the hits and misses of the file cache and the number of cached files.
+
+    Returns:
+        dict: The statistics of the cache.
+    """
+    return {
+        "hits": file_cache_total.labels("hit").value,
+        "misses": file_cache_total.labels("miss").value,
+        "files": len(_cache),
+    }
+
+
+def clear_cache() -> None:
+    """
+    Forgets the contents of every cached file.
+    """
+    with _cache_lock:
+        _cache.clear()
@@ -1,23 +1,78 @@
-from configparser import ConfigParser
+import argparse
+import json
+import os
+import threading
+import time
 
 from src.main.python.manager.file_manager import FileManager
+from src.main.python.settings import configuration
 
 # CONSTANTS
-config = ConfigParser()
-config.read("configuration.ini")
-token = config.get("HASHING", "key")
+token = configuration.get("HASHING", "key")
+message_storage = configuration.get("FILE_MANAGER", "message_storage")
+fsync_batch = configuration.getint("FILE_MANAGER", "message_fsync_batch")
+fsync_interval = configuration.getfloat("FILE_MANAGER", "message_fsync_interval")
 
-import json
+ARRAY = "array"
+JOURNAL = "journal"
 
 
 class MessageManager(FileManager):
     """
     A class to manage messages and usernames.
 
+    In array mode the file holds a JSON array and every message rewrites it. In journal mode every
+    message is a JSON line appended to the file, so saving a message costs the same whatever the
+    number of stored messages. The file is fsynced every fsync_batch messages or fsync_interval
+    seconds, whatever comes first, and when the manager is closed.
+
     Attributes:
         file_path (str): The path to the file storing messages.
+        storage (str): The storage mode, "array" or "journal".
     """
 
+    def __init__(self, file_path: str, storage: str = message_storage, fsync_batch: int = fsync_batch,
+                 fsync_interval: float = fsync_interval):
+        """
+        Initializes the MessageManager with the path to the file.
+
+        Args:
+            file_path (str): The path to the file storing messages.
+            storage (str, optional): The storage mode, "array" or "journal".
+            fsync_batch (int, optional): The number of journal messages written between two fsyncs.
+            fsync_interval (float, optional): The maximum seconds between two fsyncs of the journal.
+
+        Raises:
+            ValueError: If the storage mode is unknown, or the file is an array and the mode is journal.
+        """
+        if storage not in (ARRAY, JOURNAL):
+            raise ValueError(f"Unknown message storage: {storage}")
+        self.storage = storage
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        super().__init__(file_path)
+        self._journal = None
+        self._count = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        if storage == JOURNAL:
+            if _is_array_file(file_path):
+                raise ValueError(f"{file_path} holds a JSON array: convert it with "
+                                 f"'python -m src.main.python.manager.message_manager convert {file_path}'")
+            _truncate_partial_line(file_path)
+            self._count = count_journal(file_path)
+            self._journal = open(file_path, "a", encoding="utf-8")
+
+    def _create_file(self) -> None:
+        """
+        Creates the file to store messages, empty in journal mode.
+        """
+        if self.storage == JOURNAL:
+            open(self.file_path, "w").close()
+        else:
+            super()._create_file()
+
     def save_message(self, username: str, message: str) -> None:
         """
         Saves a username and message pair to the file.
@@ -26,9 +81,18 @@ class MessageManager(FileManager):
             username (str): The username.
             message (str): The message.
         """
-        messages = self._load()
         message_data = {"username": username, "message": message}
-        messages.append(message_data)
+        if self.storage == JOURNAL:
+            with self._lock:
+                self._journal.write(json.dumps(message_data) + "\n")
+                self._journal.flush()
+                self._count += 1
+                self._unsynced += 1
+                if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+            return
+
+        messages = self._load() + [message_data]  # La lista cargada es la del caché y no se modifica
         with open(self.file_path, "w") as file:
             json.dump(messages, file)
 
@@ -39,5 +103,147 @@ class MessageManager(FileManager):
         Returns:
             int: The number of messages.
         """
+        if self.storage == JOURNAL:
+            return self._count
         messages = self._load()
         return len(messages)
+
+    def close(self) -> None:
+        """
+        Syncs and closes the journal. Does nothing in array mode.
+        """
+        with self._lock:
+            if self._journal is not None:
+                self._sync()
+                self._journal.close()
+                self._journal = None
+
+    def _sync(self) -> None:
+        if self._unsynced:
+            os.fsync(self._journal.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+
+def _is_array_file(path: str) -> bool:
+    with open(path, "r", encoding="utf-8") as file:
+        return file.read(64).lstrip().startswith("[")
+
+
+def _truncate_partial_line(path: str) -> None:
+    # Una línea cortada por una caída se quitaría al compactar; aquí se descarta para no pegarle la siguiente
+    with open(path, "rb+") as file:
+        size = end = file.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - 4096)
+            file.seek(start)
+            newline = file.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            file.truncate(end)
+
+
+def read_journal(path: str) -> list:
+    """
+    Reads every complete message of a journal. A last line cut by a crash is ignored.
+
+    Args:
+        path (str): The path of the journal.
+
+    Returns:
+        list: List of dictionaries containing usernames and messages.
+    """
+    messages = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.endswith("\n"):
+                messages.append(json.loads(line))
+    return messages
+
+
+def count_journal(path: str) -> int:
+    """
+    Counts the complete messages of a journal without parsing them.
+
+    Args:
+        path (str): The path of the journal.
+
+    Returns:
+        int: The number of messages.
+    """
+    count = 0
+    with open(path, "rb") as file:
+        while chunk := file.read(1 << 20):
+            count += chunk.count(b"\n")
+    return count
+
+
+def _replace(path: str, lines) -> None:
+    # Se escribe en un fichero temporal y se renombra, para no dejar nunca el fichero a medias
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        file.writelines(lines)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def convert(path: str, to: str = JOURNAL) -> int:
+    """
+    Converts a message file between the array and the journal formats, in place.
+
+    Must not be run while a server is using the file.
+
+    Args:
+        path (str): The path of the message file.
+        to (str, optional): The format to convert to, "journal" or "array".
+
+    Returns:
+        int: The number of converted messages.
+    """
+    if _is_array_file(path):
+        with open(path, "r", encoding="utf-8") as file:
+            messages = json.load(file)
+    else:
+        messages = read_journal(path)
+    if to == JOURNAL:
+        _replace(path, (json.dumps(message) + "\n" for message in messages))
+    else:
+        _replace(path, [json.dumps(messages)])
+    return len(messages)
+
+
+def compact(path: str) -> int:
+    """
+    Rewrites a journal without the line cut by a crash, if any.
+
+    Must not be run while a server is using the file.
+
+    Args:
+        path (str): The path of the journal.
+
+    Returns:
+        int: The number of messages kept.
+    """
+    messages = read_journal(path)
+    _replace(path, (json.dumps(message) + "\n" for message in messages))
+    return len(messages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline maintenance of the message file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="convert between the array and journal formats")
+    convert_parser.add_argument("path")
+    convert_parser.add_argument("--to", choices=(JOURNAL, ARRAY), default=JOURNAL)
+    compact_parser = subparsers.add_parser("compact", help="drop a journal line cut by a crash")
+    compact_parser.add_argument("path")
+    arguments = parser.parse_args()
+
+    if arguments.command == "convert":
+        print(f"{convert(arguments.path, arguments.to)} messages converted to {arguments.to}")
+    else:
+        print(f"{compact(arguments.path)} messages kept")
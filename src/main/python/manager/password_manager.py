@@ -1,23 +1,50 @@
+import ast
 import hmac
 import json
-from configparser import ConfigParser
+import os
+import threading
 
 from src.main.python.manager.file_manager import FileManager
+from src.main.python.settings import configuration
 
 # CONSTANTS
-config = ConfigParser()
-config.read("configuration.ini")
-token = config.get("HASHING", "key")
+token = configuration.get("HASHING", "key")
+compaction_threshold = configuration.getint("FILE_MANAGER", "password_compaction_threshold")
+
+# Resumen con el que se compara cuando el usuario no existe, para que la comparación tarde lo mismo
+MISSING_DIGEST = "0" * 64
 
 
 class PasswordManager(FileManager):
     """
     A class to manage passwords.
 
+    The credentials are kept in memory as a username -> HMAC dictionary, so a check is a single
+    lookup. New passwords are appended to a journal next to the password file instead of rewriting
+    it, and the journal is merged into the file once it holds compaction_threshold entries. The
+    dictionary is reloaded only when the file or the journal are changed by someone else.
+
     Attributes:
         file_path (str): The path to the file storing passwords.
+        journal_path (str): The path to the journal of new passwords.
     """
 
+    def __init__(self, file_path: str, compaction_threshold: int = compaction_threshold):
+        """
+        Initializes the PasswordManager with the path to the password file.
+
+        Args:
+            file_path (str): The path to the file storing passwords.
+            compaction_threshold (int, optional): The number of journal entries that triggers a compaction.
+        """
+        super().__init__(file_path)
+        self.journal_path = file_path + ".journal"
+        self.compaction_threshold = compaction_threshold
+        self._credentials = {}
+        self._journal_entries = 0
+        self._versions = None
+        self._lock = threading.Lock()
+
     def check_password(self, username: str, password: str) -> bool:
         """
         Checks if the given username and password match the stored ones.
@@ -29,28 +56,32 @@ class PasswordManager(FileManager):
         Returns:
             bool: True if the username and password match, False otherwise.
         """
-        try:
-            passwords = self._load()
-        except FileNotFoundError:
-            passwords = []
         encrypted = self.encrypt_password(password)
-        credentials = {"username": username, "password": encrypted}
-        return str(credentials) in passwords
+        with self._lock:
+            self._reload_if_changed()
+            stored = self._credentials.get(username)
+        return hmac.compare_digest(stored or MISSING_DIGEST, encrypted) and stored is not None
 
     def save_password(self, username: str, password: str) -> None:
         """
-        Saves a username and encrypted password pair to the file.
+        Saves a username and encrypted password pair.
+
+        The pair is appended to the journal. A later password for the same username replaces the earlier one.
 
         Args:
             username (str): The username.
             password (str): The password.
         """
-        passwords = self._load()
         encrypted = self.encrypt_password(password)
-        credentials = {"username": username, "password": encrypted}
-        passwords.append(str(credentials))
-        with open(self.file_path, "w") as file:
-            json.dump(passwords, file)
+        with self._lock:
+            self._reload_if_changed()
+            with open(self.journal_path, "a") as journal:
+                journal.write(json.dumps({"username": username, "password": encrypted}) + "\n")
+            self._credentials[username] = encrypted
+            self._journal_entries += 1
+            if self._journal_entries >= self.compaction_threshold:
+                self._compact()
+            self._versions = self._current_versions()
 
     def encrypt_password(self, password: str) -> str:
         """
@@ -67,10 +98,82 @@ class PasswordManager(FileManager):
 
     def get_num_passwords(self) -> int:
         """
-        Returns the number of passwords stored in the file.
+        Returns the number of users with a stored password.
 
         Returns:
             int: The number of passwords.
         """
-        passwords = self._load()
-        return len(passwords)
+        with self._lock:
+            self._reload_if_changed()
+            return len(self._credentials)
+
+    def compact(self) -> None:
+        """
+        Merges the journal into the password file.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            self._compact()
+            self._versions = self._current_versions()
+
+    def _current_versions(self) -> tuple:
+        """
+        Returns what identifies the current contents of the password file and the journal.
+        """
+        versions = []
+        for path in (self.file_path, self.journal_path):
+            try:
+                stat = os.stat(path)
+                versions.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                versions.append(None)
+        return tuple(versions)
+
+    def _reload_if_changed(self) -> None:
+        """
+        Reloads the credentials if the password file or the journal changed since they were read.
+        """
+        versions = self._current_versions()
+        if versions == self._versions:
+            return
+        credentials = {}
+        try:
+            entries = self._load()
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            # El fichero guarda cada credencial como el str() de un diccionario
+            if isinstance(entry, str):
+                entry = ast.literal_eval(entry)
+            credentials[entry["username"]] = entry["password"]
+        journal_entries = 0
+        try:
+            with open(self.journal_path, "r") as journal:
+                for line in journal:
+                    if not line.endswith("\n"):
+                        break  # Una línea a medio escribir
+                    entry = json.loads(line)
+                    credentials[entry["username"]] = entry["password"]
+                    journal_entries += 1
+        except FileNotFoundError:
+            pass
+        self._credentials = credentials
+        self._journal_entries = journal_entries
+        self._versions = versions
+
+    def _compact(self) -> None:
+        """
+        Rewrites the password file with every credential and empties the journal.
+
+        The file is written to a temporary file and renamed, so it is never left half written.
+        """
+        passwords = [str({"username": username, "password": encrypted})
+                     for username, encrypted in self._credentials.items()]
+        temporary_path = self.file_path + ".tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(passwords, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.file_path)
+        open(self.journal_path, "w").close()
+        self._journal_entries = 0
@@ -0,0 +1,363 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from loguru import logger
+
+from src.main.python.settings import configuration
+
+# CONSTANTS
+metrics_enabled = configuration.getboolean("METRICS", "enabled")
+metrics_host = configuration.get("METRICS", "host")
+metrics_port = configuration.getint("METRICS", "port")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """
+    A value that only goes up.
+    """
+    kind = "counter"
+    # Cómo se combinan los valores de varios procesos
+    aggregation = "sum"
+
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name: str, labels: str) -> list:
+        return [(name, labels, self.value)]
+
+    def snapshot(self) -> float:
+        return self.value
+
+    def merge(self, state: float) -> None:
+        self.inc(state)
+
+
+class Gauge(Counter):
+    """
+    A value that goes up and down.
+    """
+    kind = "gauge"
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+
+class MaxGauge(Gauge):
+    """
+    A gauge that merges to the largest value instead of the sum, for values such as probabilities
+    that can not be added across processes.
+    """
+    aggregation = "max"
+
+    def merge(self, state: float) -> None:
+        with self._lock:
+            self.value = max(self.value, state)
+
+
+class Histogram:
+    """
+    The distribution of observed values in cumulative buckets.
+
+    Attributes:
+        buckets (tuple): The upper bounds of the buckets, in ascending order.
+    """
+    kind = "histogram"
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile by linear interpolation inside the bucket that contains it.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimated value, 0 if nothing was observed.
+        """
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count > 0:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def samples(self, name: str, labels: str) -> list:
+        with self._lock:
+            counts = list(self.counts)
+            total, value_sum = self.count, self.sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            samples.append((f"{name}_bucket", _join_labels(labels, f'le="{le}"'), cumulative))
+        samples.append((f"{name}_sum", labels, value_sum))
+        samples.append((f"{name}_count", labels, total))
+        return samples
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return self.buckets, list(self.counts), self.sum, self.count
+
+    def merge(self, state: tuple) -> None:
+        _, counts, value_sum, total = state
+        with self._lock:
+            self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+            self.sum += value_sum
+            self.count += total
+
+
+class Metric:
+    """
+    A named metric, with one child per combination of label values.
+
+    Attributes:
+        name (str): The name of the metric.
+        help (str): The description of the metric.
+        labelnames (tuple): The names of the labels.
+    """
+
+    def __init__(self, name: str, help: str, factory, labelnames: tuple = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.factory = factory
+        child = factory()
+        self.kind = child.kind
+        self.aggregation = getattr(child, "aggregation", "sum")
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        Returns the child for the given label values, creating it if needed.
+        """
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self.factory())
+        return child
+
+    def __getattr__(self, attribute):
+        # Las métricas sin etiquetas se usan directamente: metric.inc(), metric.observe(...)
+        if attribute.startswith("_") or self.__dict__.get("labelnames", True):
+            raise AttributeError(attribute)
+        return getattr(self.labels(), attribute)
+
+    def children(self) -> dict:
+        with self._lock:
+            return dict(self._children)
+
+    def samples(self) -> list:
+        samples = []
+        for values, child in sorted(self.children().items()):
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.labelnames, values))
+            samples += child.samples(self.name, labels)
+        return samples
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process, rendered in the Prometheus text format.
+    """
+
+    def __init__(self) -> None:
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name: str, help: str, factory, labelnames: tuple) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric(name, help, factory, tuple(labelnames))
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Metric:
+        return self._register(name, help, Counter, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: tuple = (), aggregation: str = "sum") -> Metric:
+        return self._register(name, help, MaxGauge if aggregation == "max" else Gauge, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Metric:
+        return self._register(name, help, lambda: Histogram(buckets), labelnames)
+
+    def get(self, name: str) -> Metric:
+        return self._metrics.get(name)
+
+    def snapshot(self) -> list:
+        """
+        Returns the state of every metric, which can be sent to another process and merged there.
+
+        Returns:
+            list: (name, help, kind, labelnames, {label values: state}, aggregation) for every metric.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [(metric.name, metric.help, metric.kind, metric.labelnames,
+                 {values: child.snapshot() for values, child in metric.children().items()}, metric.aggregation)
+                for metric in metrics]
+
+    def merge(self, snapshot: list) -> None:
+        """
+        Adds the state of a snapshot to the metrics of this registry, creating the missing ones. Gauges
+        registered with aggregation "max" keep the largest value instead.
+
+        Args:
+            snapshot (list): A snapshot returned by MetricsRegistry.snapshot.
+        """
+        for name, help, kind, labelnames, children, aggregation in snapshot:
+            if kind == "histogram":
+                buckets = next(iter(children.values()))[0] if children else LATENCY_BUCKETS
+                metric = self.histogram(name, help, labelnames, buckets)
+            elif kind == "gauge":
+                metric = self.gauge(name, help, labelnames, aggregation)
+            else:
+                metric = self.counter(name, help, labelnames)
+            for values, state in children.items():
+                metric.labels(*values).merge(state)
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _join_labels(labels: str, extra: str) -> str:
+    return f"{labels},{extra}" if labels else extra
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the metrics rendered by the server on GET /metrics and, if the server has a profiler, a
+    profile of the next seconds on GET /profile?seconds=<seconds>.
+    """
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self.send_text(self.server.render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif url.path == "/profile" and self.server.profile is not None:
+            try:
+                seconds = float(parse_qs(url.query).get("seconds", ["10"])[0])
+            except ValueError:
+                self.send_error(400, "seconds must be a number")
+                return
+            try:
+                self.send_text(self.server.profile(seconds), "text/plain; charset=utf-8")
+            except RuntimeError as e:
+                self.send_error(409, str(e))
+        else:
+            self.send_error(404)
+
+    def send_text(self, text: str, content_type: str) -> None:
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # Cada scrape no debe acabar en el log del servidor
+
+
+class MetricsServer:
+    """
+    Local HTTP server that exposes the metrics for scraping.
+    """
+
+    def __init__(self, host: str = metrics_host, port: int = metrics_port, render=None, profile=None) -> None:
+        """
+        Initializes the MetricsServer.
+
+        Args:
+            host (str, optional): The host to listen on.
+            port (int, optional): The port to listen on.
+            render (Callable, optional): Returns the metrics to serve. Defaults to rendering the registry.
+            profile (Callable, optional): Returns a profile of the given seconds. Without it there is no /profile.
+        """
+        self.host = host
+        self.port = port
+        self.render = render or registry.render
+        self.profile = profile
+        self.http_server = None
+
+    def start(self) -> None:
+        """
+        Starts serving the metrics in a background thread.
+        """
+        try:
+            self.http_server = ThreadingHTTPServer((self.host, self.port), MetricsRequestHandler)
+        except OSError as e:
+            logger.error(f"Could not start the metrics server on {self.host}:{self.port}: {e}")
+            return
+        self.http_server.daemon_threads = True
+        self.http_server.render = self.render
+        self.http_server.profile = self.profile
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+        logger.info(f"Metrics available on http://{self.host}:{self.port}/metrics")
+
+    def stop(self) -> None:
+        """
+        Stops the HTTP server.
+        """
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+
+
+registry = MetricsRegistry()
+
+requests_total = registry.counter("securehotel_requests_total", "Petition batches processed, by status.",
+                                  ("status",))
+request_duration_seconds = registry.histogram("securehotel_request_duration_seconds",
+                                              "Time to process a petition batch.")
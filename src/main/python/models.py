@@ -6,14 +6,99 @@ from Cryptodome.Hash import SHA256
 from Cryptodome.PublicKey import RSA
 from Cryptodome.Signature import pkcs1_15
 from loguru import logger
-from peewee import SqliteDatabase, Model, DateField, CharField, IntegerField, TimeField, DateTimeField
+from peewee import Model, DateField, CharField, IntegerField, TimeField, DateTimeField, chunked, fn
+from playhouse.migrate import SqliteMigrator
+from playhouse.pool import PooledSqliteDatabase
 import traceback
 
+from src.main.python.codec import json_codec
+from src.main.python.key_cache import convert_to_pem
+from src.main.python.metrics import registry
+from src.main.python.profiling import stage
+from src.main.python.replay_filter import petition_key, replay_filter
+from src.main.python.settings import configuration
+from src.main.python.signature_verifier import signature_verifier, verify_signature
 
-db = SqliteDatabase('data.db')
+# CONSTANTS
+database_path = configuration.get("DATABASE", "path")
+pool_size = configuration.getint("DATABASE", "pool_size")
+pool_timeout = configuration.getint("DATABASE", "pool_timeout")
+pragmas = {
+    'journal_mode': configuration.get("DATABASE", "journal_mode"),
+    'synchronous': configuration.get("DATABASE", "synchronous"),
+    'cache_size': configuration.getint("DATABASE", "cache_size"),
+    'mmap_size': configuration.getint("DATABASE", "mmap_size"),
+    'busy_timeout': configuration.getint("DATABASE", "busy_timeout"),
+}
+
+# Cada hilo usa su propia conexión, tomada del pool y devuelta al cerrarla
+db = PooledSqliteDatabase(None)
+
+petitions_total = registry.counter("securehotel_petitions_total", "Petitions processed, by result.", ("result",))
+
+# Límite de variables por sentencia de las versiones de SQLite anteriores a la 3.32
+SQLITE_MAX_VARIABLES = 999
+
+
+def init_database(path: str = database_path, database_pragmas: dict = None) -> None:
+    """
+    Points the database of the models at the given file.
+
+    Args:
+        path (str, optional): The path of the SQLite file.
+        database_pragmas (dict, optional): The pragmas set on every new connection. Defaults to the configured ones.
+    """
+    if not db.deferred:
+        db.close_all()  # Las conexiones del pool apuntan al fichero anterior
+    # Las conexiones del pool pasan de un hilo a otro, pero nunca las usan dos hilos a la vez
+    db.init(path, max_connections=pool_size, timeout=pool_timeout, check_same_thread=False,
+            pragmas=pragmas if database_pragmas is None else database_pragmas)
+
+
+init_database()
+
+
+class SchemaVersion(Model):
+    """
+    The schema version of every model table, as left by BaseModel.migrate.
+    """
+    table = CharField(primary_key=True)
+    version = IntegerField(default=0)
+
+    class Meta:
+        database = db
+        table_name = 'schema_versions'
 
 
 class BaseModel(Model):
+    # migrations[i] lleva la tabla de la versión i a la i + 1; nunca se modifican las ya publicadas
+    migrations = ()
+
+    @classmethod
+    def migrate(cls) -> None:
+        """
+        Creates the table of the model or brings an existing one up to date, keeping its data.
+
+        A new table is created with the current schema and marked as up to date. An existing one
+        gets the migrations it is missing, in order, inside a single transaction.
+        """
+        with db.connection_context(), db.atomic():
+            db.create_tables([SchemaVersion])
+            table = cls._meta.table_name
+            if not cls.table_exists():
+                db.create_tables([cls])
+                SchemaVersion.replace(table=table, version=len(cls.migrations)).execute()
+                logger.info(f"Table {table} created at version {len(cls.migrations)}")
+                return
+
+            schema_version = SchemaVersion.get_or_none(SchemaVersion.table == table)
+            version = schema_version.version if schema_version else 0
+            migrator = SqliteMigrator(db)
+            for migration in cls.migrations[version:]:
+                migration(migrator, cls)
+                version += 1
+                logger.info(f"Table {table} migrated to version {version}")
+            SchemaVersion.replace(table=table, version=version).execute()
 
     @classmethod
     def create_new_table(cls):
@@ -33,6 +118,14 @@ class BaseModel(Model):
         database = db
 
 
+def add_client_order_date_index(migrator: SqliteMigrator, model: type) -> None:
+    """
+    Adds the (client_id, order_date) index used to find the latest petitions of a client.
+    """
+    # Mismo nombre que el índice declarado en Meta.indexes para las tablas nuevas
+    db.execute(model.index(model.client_id, model.order_date).safe())
+
+
 class ClientPetition(BaseModel):
     client_id = IntegerField(default=0)
     name_material = CharField(max_length=100)
@@ -42,9 +135,53 @@ class ClientPetition(BaseModel):
     def __str__(self):
         return f'{self.client_id} {self.name_material} {self.amount}'
 
+    migrations = (add_client_order_date_index,)
+
     class Meta:
-        db_table = 'client_petitions'
+        table_name = 'client_petitions'
         order_by = ('order_date',)
+        indexes = (
+            (('client_id', 'order_date'), False),
+        )
+
+    @classmethod
+    def recent_order_dates(cls, limit: int):
+        """
+        Returns the most recent order dates of every client.
+
+        Args:
+            limit (int): The maximum number of order dates per client.
+
+        Returns:
+            Iterator of (client_id, order_date) pairs.
+        """
+        ranked = (cls.select(cls.client_id, cls.order_date,
+                             fn.ROW_NUMBER().over(partition_by=[cls.client_id],
+                                                  order_by=[cls.order_date.desc()]).alias('position'))
+                  .alias('ranked'))
+        return (cls.select(ranked.c.client_id, ranked.c.order_date)
+                .from_(ranked)
+                .where(ranked.c.position <= limit)
+                .tuples()
+                .iterator())
+
+    @classmethod
+    def latest_order_dates(cls, client_id: int, limit: int) -> list:
+        """
+        Returns the most recent order dates of a client.
+
+        Args:
+            client_id (int): The client id.
+            limit (int): The maximum number of order dates.
+
+        Returns:
+            list: The order dates, the most recent first.
+        """
+        query = (cls.select(cls.order_date)
+                 .where(cls.client_id == client_id)
+                 .order_by(cls.order_date.desc())
+                 .limit(limit))
+        return [order_date for order_date, in query.tuples()]
 
     def to_json(self) -> str:
         return json.dumps(self.to_dict(), ensure_ascii=False)
@@ -58,34 +195,126 @@ class ClientPetition(BaseModel):
         }
 
     @staticmethod
-    def from_jsons(json_string: str) -> 'ClientPetition':
-        data = json.loads(json_string)
-        for value in data:
-
-            if 'client_id' in value:
-                client_id, name_material, amount, order_date = ClientPetition._parse(value,
-                                                                                                        'client_id',
-                                                                                                        'name_material',
-                                                                                                        'amount',
-                                                                                                        'digital_signature',
-                                                                                                        'order_date',
-                                                                                     'public_key')
-
-            else:
-                client_id, name_material, amount, digital_signature, order_date = ClientPetition._parse(value,
-                                                                                                        'clientId',
-                                                                                                        'nameMaterial',
-                                                                                                        'amount',
-                                                                                                        'digitalSignature',
-                                                                                                        'orderDate',
-                                                                                                        'publicKey')
-
-            ClientPetition.create(client_id=client_id, name_material=name_material, amount=amount,
-                                  order_date=order_date)
+    def from_jsons(petitions, all_or_nothing: bool = True, check=None) -> list:
+        """
+        Validates, verifies and saves a batch of petitions.
+
+        Every petition is validated first. Petitions already saved, as remembered by the replay filter,
+        and the later copies of a petition repeated within the batch are rejected, and then all the
+        other signatures of the batch are verified together by the signature verifier, which spreads
+        them over its worker processes. Only then is the batch written, in a single transaction, which
+        first runs the check if one is given.
+
+        The digital signature and the public key of every petition are base64 strings, or raw bytes
+        when the client used a binary codec.
+
+        Args:
+            petitions (list | str): The decoded petitions, or their JSON array.
+            all_or_nothing (bool, optional): Reject the whole batch if any signature is invalid. Otherwise
+                only the petitions with a valid signature are saved.
+            check (callable, optional): Called inside the transaction before the batch is written, as described in
+                insert_batch.
+
+        Returns:
+            list: One bool per petition, True if its signature was valid and it was saved.
+
+        Raises:
+            ValueError: If a petition is invalid, or any petition is replayed or has an invalid signature and
+                all_or_nothing is set.
+        """
+        with stage("parse"):
+            data = json_codec.loads(petitions) if isinstance(petitions, (str, bytes)) else petitions
+            petitions = []
+            for value in data:
+
+                if 'client_id' in value:
+                    petitions.append(ClientPetition._parse(value, 'client_id', 'name_material', 'amount',
+                                                           'digital_signature', 'order_date', 'public_key'))
+                else:
+                    petitions.append(ClientPetition._parse(value, 'clientId', 'nameMaterial', 'amount',
+                                                           'digitalSignature', 'orderDate', 'publicKey'))
+
+            items = [(public_key, order_date, digital_signature if isinstance(digital_signature, bytes)
+                      else base64.b64decode(digital_signature))
+                     for _, _, _, digital_signature, order_date, public_key in petitions]
+
+        # Las peticiones ya guardadas se rechazan antes de verificar su firma
+        with stage("replay_check"):
+            keys = [petition_key(petition[0], *item) for petition, item in zip(petitions, items)]
+            replayed = [replay_filter is not None and replay_filter.seen(key) for key in keys]
+            # Las copias de una petición dentro del mismo lote también son repeticiones
+            batch_keys = set()
+            for index, key in enumerate(keys):
+                if key in batch_keys:
+                    replayed[index] = True
+                batch_keys.add(key)
+        if any(replayed):
+            if all_or_nothing:
+                petitions_total.labels("rejected").inc(len(petitions))
+                raise ValueError("Replayed petition")
+            for (client_id, *_), is_replay in zip(petitions, replayed):
+                if is_replay:
+                    logger.error(f"Replayed petition for client {client_id}")
+
+        # Verificar las firmas digitales de todo el lote
+        fresh = [index for index, is_replay in enumerate(replayed) if not is_replay]
+        with stage("verify"):
+            verified = signature_verifier.verify_batch([items[index] for index in fresh], all_or_nothing)
+        results = [False] * len(petitions)
+        for index, valid in zip(fresh, verified):
+            results[index] = valid
+        if all_or_nothing and not all(results):
+            petitions_total.labels("rejected").inc(len(petitions))
+            raise ValueError("Digital signature verification failed")
+
+        rows = []
+        for (client_id, name_material, amount, _, order_date, _), valid, is_replay in zip(petitions, results, replayed):
+            if not valid:
+                if not is_replay:
+                    logger.error(f"Digital signature verification failed for client {client_id}")
+                continue
+            rows.append({'client_id': client_id, 'name_material': name_material, 'amount': amount,
+                         'order_date': order_date})
+
+        with stage("insert"):
+            ClientPetition.insert_batch(rows, check)
+        if replay_filter is not None:
+            # Solo se recuerdan una vez confirmadas, para que un lote fallido se pueda reintentar
+            replay_filter.add([key for key, valid in zip(keys, results) if valid])
+        petitions_total.labels("saved").inc(len(rows))
+        petitions_total.labels("rejected").inc(len(petitions) - len(rows))
+        for _ in rows:
             logger.success(f"Digital Sign verified and Delivery Petition has been saved succesfully.")
+        return results
+
+    @classmethod
+    def insert_batch(cls, rows: list, check=None) -> None:
+        """
+        Saves a batch of already validated petitions in a single transaction.
+
+        The rows are inserted with multi-row INSERT statements, chunked so that no statement uses more
+        bound variables than SQLite allows. Either the whole batch is saved or none of it.
+
+        With a check, the transaction takes the write lock as it begins (BEGIN IMMEDIATE) and runs the
+        check before writing, so no other connection can save rows between the check and the insert.
+        An exception raised by the check leaves the batch unsaved.
+
+        Args:
+            rows (list): Dictionaries with the field values of every petition.
+            check (callable, optional): Called with no arguments before the rows are written.
+        """
+        if not rows:
+            return
+        rows_per_statement = max(1, SQLITE_MAX_VARIABLES // len(rows[0]))
+        with db.atomic(lock_type="IMMEDIATE" if check else None):
+            if check is not None:
+                check()
+            for chunk in chunked(rows, rows_per_statement):
+                cls.insert_many(chunk).execute()
 
     @staticmethod
-    def _parse(data, key_client_id, key_name_material, key_amount, key_digital_signature, key_order_date, key_public_key) -> None:
+    def _parse(data, key_client_id, key_name_material, key_amount, key_digital_signature, key_order_date,
+               key_public_key) -> tuple:
         client_id = data[key_client_id]
         pk = data[key_public_key]
         if client_id.isdigit():
@@ -102,42 +331,17 @@ class ClientPetition(BaseModel):
             raise ValueError("Invalid order_date")
         order_date = datetime.strptime(order_date, '%Y-%m-%d %H:%M:%S')
 
-        # Verificar la firma digital
-        signature = base64.b64decode(digital_signature)  # Decodificar la firma digital de base64
-        if not ClientPetition.verify_signature(pk, order_date, signature):
-            raise ValueError("Digital signature verification failed")
-
-        return client_id, name_material, amount, digital_signature, order_date
+        return client_id, name_material, amount, digital_signature, order_date, pk
 
     @staticmethod
     def verify_signature(public_key, order_date, signature):
-        # Importar la clave pública
-        public_key = RSA.import_key(ClientPetition.convert_to_pem(public_key))
-
-        # Crear un objeto verificador de firma
-        verifier = pkcs1_15.new(public_key)
-
-        # Convertir la fecha de pedido a una cadena de caracteres y luego codificarla en UTF-8
-        order_date_str = order_date.strftime("%Y-%m-%d %H:%M:%S")
-        order_date_bytes = order_date_str.encode('utf-8')
-
-        # Calcular el hash de los datos
-        digest = SHA256.new(order_date_bytes)
-
-        # Verificar la firma
-        try:
-            verifier.verify(digest, signature)
-            print("Verified signature")
-            return True  # La firma es válida
-        except ValueError:
-            return False  # La firma no es válida
+        return verify_signature(public_key, order_date, signature)
 
     import base64
 
     @staticmethod
     def convert_to_pem(public_key_base64):
-        public_key_pem = "-----BEGIN PUBLIC KEY-----\n" + public_key_base64 + "\n-----END PUBLIC KEY-----"
-        return public_key_pem
+        return convert_to_pem(public_key_base64)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,236 @@
+import collections
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+from loguru import logger
+
+from src.main.python.metrics import registry
+from src.main.python.settings import configuration
+
+# CONSTANTS
+current_directory = os.path.dirname(os.path.abspath(__file__))
+stage_timers_enabled = configuration.getboolean("PROFILING", "stage_timers")
+sample_interval = configuration.getfloat("PROFILING", "sample_interval")
+profile_duration = configuration.getfloat("PROFILING", "profile_duration")
+profiles_path = os.path.join(current_directory, configuration.get("PROFILING", "path"))
+
+# Las etapas duran desde microsegundos, así que los buckets empiezan más abajo que los de las peticiones
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                 0.1, 0.25, 0.5, 1.0)
+
+stage_duration_seconds = registry.histogram("securehotel_stage_duration_seconds",
+                                            "Time spent in every stage of a request.", ("stage",), STAGE_BUCKETS)
+
+
+class StageTimer:
+    """
+    Context manager that observes the time spent inside it in the histogram of a stage.
+    """
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram) -> None:
+        self.histogram = histogram
+
+    def __enter__(self) -> "StageTimer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class NullTimer:
+    """
+    Context manager that does nothing, used when the stage timers are disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self) -> "NullTimer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+NULL_TIMER = NullTimer()
+_stage_histograms = {}
+
+
+def stage(name: str):
+    """
+    Times a stage of a request:
+
+        with stage("verify"):
+            ...
+
+    Args:
+        name (str): The name of the stage, the label of stage_duration_seconds.
+
+    Returns:
+        StageTimer | NullTimer: The context manager, which does nothing if the stage timers are disabled.
+    """
+    if not stage_timers_enabled:
+        return NULL_TIMER
+    histogram = _stage_histograms.get(name)
+    if histogram is None:
+        histogram = _stage_histograms.setdefault(name, stage_duration_seconds.labels(name))
+    return StageTimer(histogram)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples the stack of every thread of the process.
+
+    A background thread reads sys._current_frames every interval seconds and counts each stack. The
+    result is in the collapsed format read by flamegraph.pl and speedscope: one line per stack, with
+    the thread name and the frames from the outermost to the innermost separated by semicolons,
+    followed by the number of samples. Nothing runs while the profiler is stopped.
+
+    Attributes:
+        interval (float): The seconds between samples.
+        directory (str): The directory of the dumped profiles.
+    """
+
+    def __init__(self, interval: float = sample_interval, directory: str = profiles_path) -> None:
+        """
+        Initializes a stopped SamplingProfiler.
+
+        Args:
+            interval (float, optional): The seconds between samples.
+            directory (str, optional): The directory of the dumped profiles.
+        """
+        self.interval = interval
+        self.directory = directory
+        self._counts = collections.Counter()
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, duration: float = None) -> bool:
+        """
+        Starts sampling.
+
+        Args:
+            duration (float, optional): Stop after these seconds and dump the profile to a file.
+
+        Returns:
+            bool: True if it was started, False if it was already running.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._counts = collections.Counter()
+            self._stopped = threading.Event()
+            self._thread = threading.Thread(target=self._sample, args=(self._stopped, duration),
+                                            name="profiler", daemon=True)
+            self._thread.start()
+        logger.info(f"Profiler started, sampling every {self.interval * 1000:g} ms")
+        return True
+
+    def stop(self) -> str:
+        """
+        Stops sampling.
+
+        Returns:
+            str: The profile in the collapsed format, empty if it was not running.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return ""
+            self._stopped.set()
+        if thread is not threading.current_thread():
+            thread.join()
+        return self.collapsed()
+
+    def toggle(self) -> None:
+        """
+        Starts sampling for profile_duration seconds, or stops it early and dumps the profile.
+        """
+        if not self.start(profile_duration):
+            self.dump(self.stop())
+
+    def profile(self, seconds: float) -> str:
+        """
+        Samples the process for the given seconds.
+
+        Args:
+            seconds (float): The length of the window.
+
+        Returns:
+            str: The profile in the collapsed format.
+
+        Raises:
+            RuntimeError: If the profiler is already running.
+        """
+        if not self.start():
+            raise RuntimeError("The profiler is already running")
+        self._stopped.wait(seconds)
+        return self.stop()
+
+    def collapsed(self) -> str:
+        """
+        Returns the stacks sampled so far in the collapsed format, the most frequent first.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self._counts.most_common())
+
+    def dump(self, profile: str) -> str:
+        """
+        Writes a profile to a new file of the profiles directory.
+
+        Args:
+            profile (str): The profile in the collapsed format.
+
+        Returns:
+            str: The path of the file.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{datetime.now():%Y-%m-%d_%H-%M-%S}_profile_{os.getpid()}.txt")
+        with open(path, "w") as f:
+            f.write(profile)
+        logger.info(f"Profile with {sum(self._counts.values())} samples written to {path}")
+        return path
+
+    def _sample(self, stopped: threading.Event, duration: float) -> None:
+        deadline = None if duration is None else time.monotonic() + duration
+        own_id = threading.get_ident()
+        while not stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                self._counts[";".join(reversed(frames))] += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                self.dump(self.stop())
+                break
+
+
+def install_signal_handler(signum: int = signal.SIGUSR1) -> None:
+    """
+    Toggles the profiler of the process when it receives the signal, as in kill -USR1 <pid>.
+
+    Only the main thread can install signal handlers; elsewhere this does nothing.
+
+    Args:
+        signum (int, optional): The signal.
+    """
+    if threading.current_thread() is threading.main_thread():
+        # El manejador solo lanza un hilo: no debe escribir en el log mientras el hilo principal pueda tenerlo
+        signal.signal(signum, lambda signum, frame: threading.Thread(target=profiler.toggle, daemon=True).start())
+
+
+profiler = SamplingProfiler()
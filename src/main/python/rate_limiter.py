@@ -0,0 +1,234 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from src.main.python.settings import configuration
+
+# CONSTANTS
+max_requests = configuration.getint("RATE_LIMIT", "max_requests")
+window = timedelta(hours=configuration.getfloat("RATE_LIMIT", "window_hours"))
+idle_timeout = configuration.getfloat("RATE_LIMIT", "idle_timeout")
+
+
+def parse_order_date(order_date):
+    """
+    Returns the order date as a datetime.
+
+    Args:
+        order_date (str | datetime): The order date, as sent by the client or as stored.
+
+    Returns:
+        datetime: The order date.
+    """
+    if isinstance(order_date, str):
+        return datetime.strptime(order_date, '%Y-%m-%d %H:%M:%S')
+    return order_date
+
+
+class ClientHistory:
+    """
+    What the rate limiter remembers of one client.
+
+    Attributes:
+        count (int): The number of stored petitions, capped at max_requests + 1 since only "more than max_requests" matters.
+        order_dates (list): The most recent max_requests order dates, in ascending order.
+        reserved (list): The order dates of the batches being saved, which count as stored until they are
+            committed or released.
+        last_seen (float): The monotonic time of the last check or record.
+    """
+
+    __slots__ = ('count', 'order_dates', 'reserved', 'last_seen')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.order_dates = []
+        self.reserved = []
+        self.last_seen = time.monotonic()
+
+
+class RateLimiter:
+    """
+    In-memory sliding-window rate limiter for client petitions.
+
+    A client is rejected when it has more than max_requests stored petitions and its most recent
+    max_requests order dates fall within the window. Only those dates are kept per client, so a
+    check costs the same whatever the size of the petitions table, and the database is only read
+    once, to warm the limiter at startup.
+
+    Clients that are neither checked nor recorded for idle_timeout seconds are forgotten and start
+    again with a clean history.
+
+    Concurrent batches of a client are checked with try_acquire, which reserves the order dates of
+    the batch in the same locked step: the next batch sees them as stored until the first one is
+    committed or released, so concurrent handlers can not all pass the check.
+
+    Attributes:
+        max_requests (int): The number of petitions allowed within the window.
+        window (timedelta): The length of the window.
+        idle_timeout (float): Seconds of inactivity after which a client is forgotten.
+    """
+
+    def __init__(self, max_requests: int = max_requests, window: timedelta = window,
+                 idle_timeout: float = idle_timeout) -> None:
+        """
+        Initializes an empty RateLimiter.
+
+        Args:
+            max_requests (int, optional): The number of petitions allowed within the window.
+            window (timedelta, optional): The length of the window.
+            idle_timeout (float, optional): Seconds of inactivity after which a client is forgotten.
+        """
+        self.max_requests = max_requests
+        self.window = window
+        self.idle_timeout = idle_timeout
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def allow(self, client_id) -> bool:
+        """
+        Checks whether the client may send more petitions.
+
+        Args:
+            client_id: The client id.
+
+        Returns:
+            bool: False if the client has made too many requests, True otherwise.
+        """
+        with self._lock:
+            self._evict_idle()
+            history = self._clients.get(client_id)
+            if history is None:
+                return True
+            self._touch(client_id, history)
+            return self._allowed(history)
+
+    def try_acquire(self, client_id, order_dates: list) -> bool:
+        """
+        Checks whether the client may send more petitions and, if so, reserves the order dates of its
+        batch. Call commit once the batch is saved, or release if it is not.
+
+        Args:
+            client_id: The client id.
+            order_dates (list): The order dates of the petitions of the batch.
+
+        Returns:
+            bool: False if the client has made too many requests, True if the dates were reserved.
+        """
+        order_dates = [parse_order_date(order_date) for order_date in order_dates]
+        with self._lock:
+            self._evict_idle()
+            history = self._clients.get(client_id)
+            if history is None:
+                history = self._clients[client_id] = ClientHistory()
+            self._touch(client_id, history)
+            if not self._allowed(history):
+                return False
+            history.reserved.extend(order_dates)
+            return True
+
+    def commit(self, client_id, reserved: list, saved: list) -> None:
+        """
+        Replaces a reservation with the order dates of the petitions that were stored.
+
+        Args:
+            client_id: The client id.
+            reserved (list): The order dates reserved by try_acquire.
+            saved (list): The order dates of the stored petitions.
+        """
+        with self._lock:
+            self._evict_idle()
+            self._release(client_id, reserved)
+            self._record(client_id, saved)
+
+    def release(self, client_id, reserved: list) -> None:
+        """
+        Cancels a reservation whose batch was not stored.
+
+        Args:
+            client_id: The client id.
+            reserved (list): The order dates reserved by try_acquire.
+        """
+        with self._lock:
+            self._release(client_id, reserved)
+
+    def record(self, client_id, order_dates: list) -> None:
+        """
+        Records the order dates of petitions that have been stored.
+
+        Args:
+            client_id: The client id.
+            order_dates (list): The order dates of the stored petitions.
+        """
+        with self._lock:
+            self._evict_idle()
+            self._record(client_id, order_dates)
+
+    def replace(self, client_id, order_dates: list) -> None:
+        """
+        Replaces what is known of the client with the given stored petitions.
+
+        Args:
+            client_id: The client id.
+            order_dates (list): The order dates of the most recent stored petitions of the client.
+        """
+        with self._lock:
+            self._evict_idle()
+            self._clients.pop(client_id, None)
+            self._record(client_id, order_dates)
+
+    def warm(self, petitions) -> None:
+        """
+        Loads the stored petitions, so that a restart does not reset the limits.
+
+        Args:
+            petitions: Iterable of (client_id, order_date) pairs.
+        """
+        with self._lock:
+            for client_id, order_date in petitions:
+                self._record(client_id, [order_date])
+
+    def _allowed(self, history: ClientHistory) -> bool:
+        if history.count + len(history.reserved) <= self.max_requests:
+            return True
+        order_dates = history.order_dates
+        if history.reserved:
+            order_dates = sorted(order_dates + history.reserved)[-self.max_requests:]
+        return order_dates[-1] - order_dates[0] >= self.window
+
+    def _release(self, client_id, reserved: list) -> None:
+        history = self._clients.get(client_id)
+        if history is None:  # Olvidado por inactividad mientras se guardaba el lote
+            return
+        for order_date in reserved:
+            history.reserved.remove(parse_order_date(order_date))
+
+    def _record(self, client_id, order_dates: list) -> None:
+        history = self._clients.get(client_id)
+        if history is None:
+            history = self._clients[client_id] = ClientHistory()
+        self._touch(client_id, history)
+        for order_date in order_dates:
+            order_date = parse_order_date(order_date)
+            history.count = min(history.count + 1, self.max_requests + 1)
+            # Conservar solo las fechas más recientes, ordenadas de la más antigua a la más reciente
+            bisect.insort(history.order_dates, order_date)
+            if len(history.order_dates) > self.max_requests:
+                del history.order_dates[0]
+
+    def _touch(self, client_id, history: ClientHistory) -> None:
+        history.last_seen = time.monotonic()
+        self._clients.move_to_end(client_id)
+
+    def _evict_idle(self) -> None:
+        # Los clientes están ordenados por última actividad, así que solo se miran los más antiguos
+        deadline = time.monotonic() - self.idle_timeout
+        while self._clients:
+            client_id, history = next(iter(self._clients.items()))
+            if history.last_seen >= deadline:
+                break
+            del self._clients[client_id]
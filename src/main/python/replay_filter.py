@@ -0,0 +1,170 @@
+import base64
+import math
+import threading
+import time
+from datetime import datetime
+
+from src.main.python.metrics import registry
+from src.main.python.settings import configuration
+from src.main.python.verification_cache import digest
+
+# CONSTANTS
+replay_filter_enabled = configuration.getboolean("REPLAY_FILTER", "enabled")
+replay_filter_capacity = configuration.getint("REPLAY_FILTER", "capacity")
+replay_filter_error_rate = configuration.getfloat("REPLAY_FILTER", "error_rate")
+replay_filter_rotation_interval = configuration.getfloat("REPLAY_FILTER", "rotation_interval")
+
+replay_filter_total = registry.counter("securehotel_replay_filter_total",
+                                       "Petitions checked against the replay filter, by result.", ("result",))
+replay_filter_false_positive_rate = registry.gauge("securehotel_replay_filter_false_positive_rate",
+                                                   "Estimated probability that the replay filter flags a new petition.",
+                                                   aggregation="max")
+
+
+def petition_key(client_id: int, public_key, order_date: datetime, signature: bytes) -> bytes:
+    """
+    Returns the key of a petition in the ReplayFilter.
+
+    The public key is taken as DER bytes, so a petition replayed with another codec has the same key.
+
+    Args:
+        client_id (int): The client id.
+        public_key (str | bytes): The public key, as sent by the client.
+        order_date (datetime): The signed order date.
+        signature (bytes): The signature.
+
+    Returns:
+        bytes: The key.
+    """
+    if isinstance(public_key, str):
+        public_key = base64.b64decode(public_key)
+    return digest(client_id, public_key, order_date, signature)
+
+
+class BloomFilter:
+    """
+    Set of digests that may answer that a digest is present when it is not, but never the opposite.
+
+    Attributes:
+        capacity (int): The number of digests it is sized for.
+        size (int): The number of bits.
+        hashes (int): The number of bits set by every digest.
+        count (int): The number of digests added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        """
+        Initializes an empty BloomFilter with the optimal number of bits and hashes for its capacity.
+
+        Args:
+            capacity (int): The number of digests it is sized for.
+            error_rate (float): The false positive probability once it holds capacity digests.
+        """
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: bytes):
+        # Doble hash: los bits salen de dos mitades del digest, que ya es uniforme
+        first = int.from_bytes(key[:8], "big")
+        second = int.from_bytes(key[8:16], "big") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key: bytes) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def false_positive_rate(self) -> float:
+        """
+        Returns the estimated false positive probability with the digests added so far.
+        """
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class ReplayFilter:
+    """
+    Remembers the petitions already saved so that a replayed petition is rejected before it is verified
+    or reaches the database.
+
+    Two Bloom filters are kept: new petitions go into the current one, and the current one becomes
+    the previous one, replacing it, when it is full or every rotation_interval seconds. A petition is
+    remembered for at least one rotation, and the memory used is bounded by the two filters. A new
+    petition may be taken for a replay with the probability reported by false_positive_rate. Every
+    process has its own filter.
+
+    Attributes:
+        capacity (int): The number of petitions every filter is sized for.
+        error_rate (float): The false positive probability of a full filter.
+        rotation_interval (float): The maximum seconds between rotations.
+    """
+
+    def __init__(self, capacity: int = replay_filter_capacity, error_rate: float = replay_filter_error_rate,
+                 rotation_interval: float = replay_filter_rotation_interval) -> None:
+        """
+        Initializes an empty ReplayFilter.
+
+        Args:
+            capacity (int, optional): The number of petitions every filter is sized for.
+            error_rate (float, optional): The false positive probability of a full filter.
+            rotation_interval (float, optional): The maximum seconds between rotations.
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotation_interval = rotation_interval
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def seen(self, key: bytes) -> bool:
+        """
+        Checks whether a petition was already saved.
+
+        Args:
+            key (bytes): The key returned by petition_key.
+
+        Returns:
+            bool: True if the petition is a replay, or a false positive; False if it is new.
+        """
+        with self._lock:
+            self._rotate_if_due()
+            replayed = key in self._current or key in self._previous
+        replay_filter_total.labels("replay" if replayed else "new").inc()
+        return replayed
+
+    def add(self, keys: list) -> None:
+        """
+        Remembers saved petitions. Call it only once they are committed, so that a petition whose
+        batch failed can be retried.
+
+        Args:
+            keys (list): The keys returned by petition_key.
+        """
+        with self._lock:
+            for key in keys:
+                self._rotate_if_due()
+                self._current.add(key)
+            replay_filter_false_positive_rate.set(self.false_positive_rate())
+
+    def false_positive_rate(self) -> float:
+        """
+        Returns the estimated probability that a new petition is taken for a replay.
+        """
+        return 1 - (1 - self._current.false_positive_rate()) * (1 - self._previous.false_positive_rate())
+
+    def _rotate_if_due(self) -> None:
+        if (self._current.count >= self.capacity
+                or time.monotonic() - self._rotated_at >= self.rotation_interval):
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate)
+            self._rotated_at = time.monotonic()
+            replay_filter_false_positive_rate.set(self.false_positive_rate())
+
+
+replay_filter = ReplayFilter() if replay_filter_enabled else None
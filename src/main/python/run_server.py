@@ -1,16 +1,31 @@
-import sys
+import argparse
+import importlib
 
-from src.main.python.server import Server
+from src.main.python.supervisor import Supervisor, supervisor_workers
 
-if __name__ == "__main__":
-    # Verifica si se proporcionan los argumentos host y port
-    if len(sys.argv) != 3:
-        print("Uso: python run_server.py <host> <port>")
-        sys.exit(1)
+# Solo se importa el modo elegido, para no pagar al arrancar el import de asyncio en el modo threaded
+SERVER_MODES = {
+    "threaded": ("src.main.python.server", "Server"),
+    "async": ("src.main.python.async_server", "AsyncServer"),
+}
 
-    host = sys.argv[1]  # Obtén el host del primer argumento
-    port = int(sys.argv[2])  # Obtén el puerto del segundo argumento (convertido a entero)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the SecureHotel server.")
+    parser.add_argument("host", help="Host IP address.")
+    parser.add_argument("port", type=int, help="Port number.")
+    parser.add_argument("--mode", choices=SERVER_MODES, default="threaded",
+                        help="threaded: a fixed pool of handler threads, async: one asyncio event loop with worker "
+                             "threads for the petitions.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes sharing the port, 0 for one per CPU. Defaults to [SUPERVISOR] workers.")
+    args = parser.parse_args()
 
     # Crea una instancia del servidor con los valores proporcionados
-    server = Server(host, port)
+    module, server_class = SERVER_MODES[args.mode]
+    server_class = getattr(importlib.import_module(module), server_class)
+    workers = supervisor_workers if args.workers is None else args.workers
+    if workers == 1:
+        server = server_class(args.host, args.port)
+    else:
+        server = Supervisor(server_class, args.host, args.port, workers)
     server.start()
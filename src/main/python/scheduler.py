@@ -0,0 +1,145 @@
+import concurrent.futures
+import random
+import threading
+import time
+from typing import Callable
+
+from loguru import logger
+
+from src.main.python.metrics import registry
+from src.main.python.settings import configuration
+
+# CONSTANTS
+scheduler_workers = configuration.getint("SCHEDULER", "workers")
+
+job_runs_total = registry.counter("securehotel_job_runs_total", "Scheduled job runs, by job and status.",
+                                  ("job", "status"))
+job_duration_seconds = registry.histogram("securehotel_job_duration_seconds", "Duration of scheduled job runs.",
+                                          ("job",))
+
+
+class Job:
+    """
+    A function run periodically by the JobScheduler.
+
+    Attributes:
+        name (str): The name of the job, used in the logs and metrics.
+        function (Callable): The function to run.
+        interval (float): Seconds between the starts of two runs.
+        jitter (float): Maximum random seconds added to every start, so jobs of several servers do not align.
+        next_run (float): The monotonic time of the next run.
+        running (bool): Whether a run is in progress.
+    """
+
+    def __init__(self, name: str, function: Callable, interval: float, jitter: float) -> None:
+        self.name = name
+        self.function = function
+        self.interval = interval
+        self.jitter = jitter
+        self.running = False
+        self.next_run = time.monotonic()
+        self.schedule_next()
+
+    def schedule_next(self) -> None:
+        self.next_run += self.interval + random.uniform(0, self.jitter)
+
+
+class JobScheduler:
+    """
+    Runs periodic jobs on a long-lived pool of worker threads.
+
+    The scheduler thread only decides what is due and hands it to the pool, so a slow job never
+    delays the others. A job is never run twice at the same time: if its previous run has not
+    finished when it is due again, that run is skipped.
+    """
+
+    def __init__(self, workers: int = scheduler_workers) -> None:
+        """
+        Initializes the JobScheduler.
+
+        Args:
+            workers (int, optional): The number of threads that run the jobs.
+        """
+        self.workers = workers
+        self.jobs = []
+        self.executor = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def every(self, interval: float, function: Callable, name: str = None, jitter: float = 0.0) -> Job:
+        """
+        Schedules a function to run every interval seconds.
+
+        Args:
+            interval (float): Seconds between the starts of two runs.
+            function (Callable): The function to run.
+            name (str, optional): The name of the job. Defaults to the name of the function.
+            jitter (float, optional): Maximum random seconds added to every start.
+
+        Returns:
+            Job: The scheduled job.
+        """
+        job = Job(name or function.__name__, function, interval, jitter)
+        with self._lock:
+            self.jobs.append(job)
+        return job
+
+    def start(self) -> None:
+        """
+        Starts the scheduler thread and the worker pool.
+        """
+        self._stopped.clear()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers,
+                                                              thread_name_prefix="scheduler")
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stops scheduling new runs and waits for the runs in progress.
+
+        Args:
+            wait (bool, optional): Wait for the runs in progress to finish.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+            self.executor = None
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            with self._lock:
+                jobs = list(self.jobs)
+            for job in jobs:
+                if job.next_run > now:
+                    continue
+                if job.running:
+                    job_runs_total.labels(job.name, "skipped").inc()
+                    logger.info(f"Job {job.name} skipped: the previous run has not finished")
+                else:
+                    job.running = True
+                    self.executor.submit(self._execute, job)
+                job.schedule_next()
+                if job.next_run < now:  # Si el planificador se retrasó, no se recuperan las ejecuciones perdidas
+                    job.next_run = now + job.interval
+            # Se duerme hasta el próximo trabajo, como mucho un segundo para ver los trabajos añadidos
+            next_run = min((job.next_run for job in jobs), default=now + 1.0)
+            self._stopped.wait(min(max(next_run - time.monotonic(), 0.0), 1.0))
+
+    @staticmethod
+    def _execute(job: Job) -> None:
+        start = time.perf_counter()
+        try:
+            job.function()
+            job_runs_total.labels(job.name, "success").inc()
+        except Exception as e:
+            job_runs_total.labels(job.name, "error").inc()
+            logger.error(f"Job {job.name} failed: {e}")
+        finally:
+            job_duration_seconds.labels(job.name).observe(time.perf_counter() - start)
+            job.running = False
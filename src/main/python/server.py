@@ -1,44 +1,66 @@
-import json
+import functools
 import os
+import queue
 import socket
 import threading
 import time
-from configparser import ConfigParser
-from typing import Callable
-import concurrent.futures
-
-from datetime import datetime, timedelta
 
 import OpenSSL
 import select
 from OpenSSL import SSL
 from loguru import logger
-import schedule
-import traceback
 
 from src.main.python.certificate_utils import generate_key_pair, generate_certificate, \
     save_key_and_certificate_with_alias
-from src.main.python.logger import load_logger
+from src.main.python.codec import json_codec
+from src.main.python.framing import FrameReader, FramingError
+from src.main.python.logger import load_logger, log_payload, stop_logger
 from src.main.python.json_utils.json_response import JSONResponse
 from src.main.python.manager.message_manager import MessageManager
 from src.main.python.manager.password_manager import PasswordManager
-from src.main.python.models import ClientPetition
-from src.main.python.ssl_context_utils import jks_file_to_context
+from src.main.python.metrics import MetricsServer, metrics_enabled, registry, request_duration_seconds, \
+    requests_total
+from src.main.python.models import ClientPetition, db, pool_size, pool_timeout
+from src.main.python.profiling import install_signal_handler, profiler, stage
+from src.main.python.rate_limiter import RateLimiter
+from src.main.python.scheduler import JobScheduler
+from src.main.python.settings import configuration
+from src.main.python.signature_verifier import signature_verifier
+from src.main.python.ssl_context_utils import SessionTicketKeys, record_handshake, server_key_material, session_cache, \
+    session_tickets, ticket_rotation_interval
 from src.main.python.statistics import get_report
 
 # CONSTANTS
 current_directory = os.path.dirname(os.path.abspath(__file__))
-configuration = ConfigParser()
-configuration.read("configuration.ini")
 keystores_path = os.path.join(current_directory, configuration.get("KEYSTORE", "path"))
 server_alias = configuration.get("SERVER", "alias")
 common_name = configuration.get("SERVER", "common_name")
 password_path = os.path.join(current_directory, configuration.get("FILE_MANAGER", "password_path"))
 message_path = os.path.join(current_directory, configuration.get("FILE_MANAGER", "message_path"))
+report_interval = configuration.getfloat("SCHEDULER", "report_interval")
+report_jitter = configuration.getfloat("SCHEDULER", "report_jitter")
+listen_backlog = configuration.getint("ADMISSION", "listen_backlog")
+max_connections = configuration.getint("ADMISSION", "max_connections")
+queue_size = configuration.getint("ADMISSION", "queue_size")
+max_in_flight = configuration.getint("ADMISSION", "max_in_flight")
+handshake_timeout = configuration.getfloat("ADMISSION", "handshake_timeout")
+idle_timeout = configuration.getfloat("ADMISSION", "idle_timeout")
+reject_timeout = configuration.getfloat("ADMISSION", "reject_timeout")
+BUFFER_SIZE = 65536
+BUSY_MESSAGE = "Server busy, try again later."
+
+open_connections = registry.gauge("securehotel_open_connections", "Client connections currently open.")
+rate_limited_total = registry.counter("securehotel_rate_limited_total", "Batches rejected by the rate limiter.")
+queue_depth = registry.gauge("securehotel_queue_depth", "Accepted connections waiting for a handler.")
+admission_rejected_total = registry.counter("securehotel_admission_rejected_total",
+                                            "Connections and batches turned away because the server was saturated, "
+                                            "by reason.", ("reason",))
+connection_timeouts_total = registry.counter("securehotel_connection_timeouts_total",
+                                             "Connections closed for taking too long, by stage.", ("stage",))
 
 
 class Server:
-    def __init__(self, host: str, port: int, is_test: bool = False) -> None:
+    def __init__(self, host: str, port: int, is_test: bool = False, worker_id: int = None) -> None:
         """
         Initialize Server object.
 
@@ -46,132 +68,377 @@ class Server:
         - host (str): Host IP address.
         - port (int): Port number.
         - is_test (bool): Flag to indicate if in test mode.
+        - worker_id (int): Index of the worker process when run by the Supervisor, None otherwise.
 
         """
+        check_admission_limits()
         self.host = host
         self.port = port
+        self.worker_id = worker_id
         self.server_socket = None
+        self.ticket_keys = None
         self.password_manager = PasswordManager(password_path)
         self.message_manager = MessageManager(message_path)
         self.is_test = is_test
         self.running = False
-        try:
-            ClientPetition.drop_old_table()
-        except Exception as e:
-            logger.error(f"Error dropping table: {e}")
-        ClientPetition.create_new_table()
+        if worker_id is None:  # El Supervisor migra la base de datos antes de arrancar los workers
+            ClientPetition.migrate()
+        self.rate_limiter = RateLimiter()
+        # Conexiones aceptadas que esperan a un hilo del pool, y las que se rechazan con BUSY
+        self.connections = queue.Queue(maxsize=queue_size)
+        self.rejections = queue.Queue(maxsize=queue_size)
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.handlers = []
+        self.metrics_server = MetricsServer(profile=profiler.profile)
+        self.scheduler = JobScheduler()
+        with db.connection_context():
+            self.rate_limiter.warm(ClientPetition.recent_order_dates(self.rate_limiter.max_requests + 1))
         logger.info(f"Server initialized with host: {host} and port: {port}")
 
-    def load_certificate(self) -> SSL.Context:
+    def load_certificate(self) -> tuple:
         """
         Load SSL certificate and private key for the server.
+
+        Returns:
+            tuple: The private key, the public certificate and the trusted certificates.
+        """
+        create_keystore_if_missing()
+        return server_key_material(server_alias)
+
+    def prepare(self) -> SessionTicketKeys:
+        """
+        Prepare everything the server needs before accepting connections.
+
+        Starts the report scheduler and the rotation of the session ticket keys, loads the logger,
+        lets SIGUSR1 toggle the profiler and loads the SSL context.
+
+        Returns:
+            SessionTicketKeys: The SSL contexts of the server.
+        """
+        if not self.worker_id:  # Con varios procesos, solo el primero escribe el informe
+            self.scheduler.every(report_interval, get_report, name="monthly_report", jitter=report_jitter)
+        if ticket_rotation_interval > 0 and session_cache and session_tickets:
+            self.scheduler.every(ticket_rotation_interval, self.rotate_session_keys, name="ticket_key_rotation")
+        self.scheduler.start()
+
+        load_logger(file_suffix="" if self.worker_id is None else f"_worker{self.worker_id}")
+        install_signal_handler()
+
+        if metrics_enabled and self.worker_id is None:  # El Supervisor publica las métricas de sus workers
+            self.metrics_server.start()
+
+        self.ticket_keys = SessionTicketKeys(*self.load_certificate())
+        return self.ticket_keys
+
+    def rotate_session_keys(self) -> None:
         """
-        if not os.path.exists(keystores_path):
-            logger.info("Certificate or key not found in keystore. Generating new ones...")
-            server_key = generate_key_pair()
-            server_cert = generate_certificate(server_key, common_name)
-            save_key_and_certificate_with_alias(server_key, server_cert, server_alias)
-        context = jks_file_to_context(server_alias)
-        return context
+        Issue the session tickets with a new key.
+
+        The tickets of the previous key are still accepted until the next rotation, so the clients
+        move to the new key as they reconnect instead of all doing a full handshake at once.
+        """
+        self.ticket_keys.rotate()
+        logger.info("Session ticket keys rotated")
 
     def start(self) -> None:
         """
         Start the server.
 
         This method initializes the SSL context, binds the server socket to the specified host and port,
-        and starts listening for incoming connections. It launches a separate thread to handle each client connection.
-        """
-        threading.Thread(target=self.print_scheduler).start()
-        schedule.every(20).seconds.do(lambda: self.execute_non_blocking(get_report()))
-        
-        load_logger()
-        
-        context = self.load_certificate()
-        self.server_socket = SSL.Connection(context, socket.socket(socket.AF_INET, socket.SOCK_STREAM))
+        and starts listening for incoming connections.
+
+        The connections are served by a fixed pool of max_connections handler threads. Accepted
+        connections wait for a free handler in a queue of queue_size connections. When the queue is
+        full, the connection is answered BUSY by a single rejection thread, or simply closed if that
+        thread is behind as well, so a traffic spike never creates more threads.
+        """
+        self.prepare()
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.worker_id is not None:  # Los workers comparten el puerto y el kernel reparte las conexiones
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.server_socket.bind((self.host, int(self.port)))
-        self.server_socket.listen(5)
+        self.server_socket.listen(listen_backlog)
         self.running = True
+        self.handlers = [threading.Thread(target=self.serve_connections, args=(self.connections, self.handle_client),
+                                          name=f"handler-{index}", daemon=True) for index in range(max_connections)]
+        self.handlers.append(threading.Thread(target=self.serve_connections, args=(self.rejections, self.reject_client),
+                                              name="rejecter", daemon=True))
+        for handler in self.handlers:
+            handler.start()
         logger.info(f"Server listening on {self.host}:{self.port}")
         while self.running:
             try:
                 logger.info("Waiting for connections...")
                 client_socket, _ = self.server_socket.accept()
-                threading.Thread(target=self.handle_client, args=(client_socket,)).start()
             except Exception as e:
-                logger.error(f"Error accepting connection: {e}")
+                if self.running:  # Al parar el servidor, accept falla porque se cerró el socket
+                    logger.error(f"Error accepting connection: {e}")
                 break
+            self.admit(client_socket)
+
+    def admit(self, client_socket: socket.socket) -> None:
+        """
+        Queue an accepted connection for the handler pool, or for a BUSY response if the queue is full.
+
+        Args:
+            client_socket (socket.socket): The accepted connection, before the handshake.
+        """
+        try:
+            self.connections.put_nowait(client_socket)
+            queue_depth.set(self.connections.qsize())
+            return
+        except queue.Full:
+            pass
+        try:
+            self.rejections.put_nowait(client_socket)
+            admission_rejected_total.labels("busy").inc()
+        except queue.Full:
+            admission_rejected_total.labels("dropped").inc()
+            client_socket.close()
 
-    def print_scheduler(self) -> None:
+    def serve_connections(self, connections: queue.Queue, handler) -> None:
         """
-        Print "hello" every second.
+        Serve the connections of a queue one after another, until a None is taken from it.
+
+        Args:
+            connections (queue.Queue): The queue of accepted connections.
+            handler (Callable): Serves one connection.
         """
         while True:
-            schedule.run_pending()
-            time.sleep(1)
-            
-    def execute_non_blocking(self, func: Callable) -> None:
+            client_socket = connections.get()
+            if client_socket is None:
+                return
+            if connections is self.connections:
+                queue_depth.set(connections.qsize())
+            try:
+                handler(client_socket)
+            except Exception as e:  # Un hilo del pool no debe morir por una conexión rota
+                logger.error(f"Error serving connection: {e}")
+                client_socket.close()
+
+    def accept_tls(self, client_socket: socket.socket, deadline: float) -> SSL.Connection:
         """
-        Execute a function in a separate thread.
+        Wrap an accepted socket in a TLS connection, before the handshake.
+
+        After a rotation of the session ticket keys, the ClientHello is peeked, without consuming it,
+        to choose the SSL context that can decrypt the ticket offered by the client.
+
+        The socket is left non-blocking: every read and write of the connection goes through
+        call_before, with a deadline, so a client that stops halfway through a TLS record or stops
+        reading can not hold a handler thread forever.
+
+        Args:
+            client_socket (socket.socket): The accepted socket.
+            deadline (float): The time.monotonic() by which the handshake must be done.
+
+        Returns:
+            SSL.Connection: The connection, in accept state.
         """
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            executor.submit(func)
+        context = self.ticket_keys.current
+        if self.ticket_keys.previous is not None:
+            try:
+                if select.select([client_socket], [], [], max(0.0, deadline - time.monotonic()))[0]:
+                    context = self.ticket_keys.context_for(client_socket.recv(BUFFER_SIZE, socket.MSG_PEEK))
+            except OSError:  # El handshake fallará igual y se tratará allí
+                pass
+        client_socket.setblocking(False)
+        connection = SSL.Connection(context, client_socket)
+        connection.set_accept_state()
+        return connection
 
-    def handle_client(self, client_socket: socket) -> None:
+    def handle_client(self, client_socket: socket.socket) -> None:
+        reader = FrameReader()
+        open_connections.inc()
         try:
+            with stage("handshake"):
+                deadline = time.monotonic() + handshake_timeout
+                client_socket = self.accept_tls(client_socket, deadline)
+                try:
+                    do_handshake(client_socket, deadline)
+                except TimeoutError:
+                    connection_timeouts_total.labels("handshake").inc()
+                    logger.error(f"Error: TLS handshake not completed in {handshake_timeout:g} seconds")
+                    return
+            record_handshake(client_socket)
             logger.info(f"Connection established with {client_socket.getpeername()}")
-            while True:
+            last_activity = time.monotonic()
+            while self.running:
                 if client_socket.fileno() == -1:  # Check if the socket is still connected
                     break
-                active, _, _ = select.select([client_socket], [], [], 1)
-                if not active:
-                    continue
-                data = client_socket.recv(999999)
+                if not client_socket.pending():  # Decrypted bytes may be waiting in the SSL buffer
+                    active, _, _ = select.select([client_socket], [], [], 1)
+                    if not active:
+                        if time.monotonic() - last_activity >= idle_timeout:
+                            connection_timeouts_total.labels("idle").inc()
+                            logger.info(f"Closing connection idle for {idle_timeout:g} seconds.")
+                            break
+                        continue
+                try:
+                    with stage("recv"):
+                        data = call_before(client_socket, time.monotonic() + idle_timeout, client_socket.recv,
+                                           BUFFER_SIZE)
+                except SSL.ZeroReturnError:  # The client sent the TLS close notification
+                    data = b""
+                except TimeoutError:  # El cliente dejó un registro TLS a medias
+                    connection_timeouts_total.labels("idle").inc()
+                    logger.info(f"Closing connection idle for {idle_timeout:g} seconds.")
+                    break
                 if not data:
                     logger.info(f"Connection closed by the client.")
                     break
-                received_message = data.decode()
-                client_id = {data['clientId'] for data in json.loads(received_message)}
-
-                if len(client_id) != 1:
-                    logger.error(f"Invalid client_id: {client_id}")
-                    raise Exception("Invalid client_id")
-
-                client_id = client_id.pop()
-                self.check_client(client_id)
-
-                logger.info(f"Received message: {received_message}")
-                ClientPetition.from_jsons(received_message)
-                message = JSONResponse("SUCCESS", "Message received successfully.")
-                client_socket.sendall(message.to_json().encode("utf-8"))
-                time.sleep(1)
+                last_activity = time.monotonic()
+                for received_message in reader.feed(data):
+                    if not self.in_flight.acquire(blocking=False):
+                        admission_rejected_total.labels("in_flight").inc()
+                        message = JSONResponse("BUSY", BUSY_MESSAGE)
+                    else:
+                        try:
+                            message = self.handle_message(received_message, reader.codec)
+                        finally:
+                            self.in_flight.release()
+                    with stage("send"):
+                        send_before(client_socket, reader.encode_message(message.to_dict()),
+                                    time.monotonic() + idle_timeout)
+        except TimeoutError:  # El cliente no lee la respuesta
+            connection_timeouts_total.labels("send").inc()
+            logger.info(f"Closing connection that read nothing for {idle_timeout:g} seconds.")
         except OpenSSL.SSL.SysCallError as e:
             logger.error(f"SSL error: {e}")
-            message = JSONResponse("ERROR", "SSL error: {e}")
-            client_socket.sendall(message.to_json().encode("utf-8"))
-            time.sleep(1)
+            send_error(client_socket, reader, JSONResponse("ERROR", f"SSL error: {e}"))
         except Exception as e:
-            logger.error(f"Error: {e}", exc_info=True)
-            print(traceback.format_exc())
-            message = JSONResponse("ERROR", f"Error: {e}")
-            client_socket.sendall(message.to_json().encode("utf-8"))
-            time.sleep(1)
+            logger.opt(exception=True).error(f"Error: {e}")
+            send_error(client_socket, reader, JSONResponse("ERROR", f"Error: {e}"))
         finally:
+            open_connections.dec()
             client_socket.close()
 
-    def check_client(self, client_id):
-        if ClientPetition.select().where(ClientPetition.client_id == client_id).count() > 3:
-            # Obtener las últimas tres solicitudes del cliente, ordenadas por fecha de orden descendente
-            data = ClientPetition.select().where(ClientPetition.client_id == client_id).order_by(
-                ClientPetition.order_date.desc()).limit(3)
+    def reject_client(self, client_socket: socket.socket) -> None:
+        """
+        Answer BUSY to a connection that found the queue full, and close it.
+
+        Only the handshake and the first bytes, to learn the wire format of the client, are read.
+        Nothing is decoded. A single thread answers every rejected connection, so the whole answer
+        must be done within reject_timeout seconds.
+
+        Args:
+            client_socket (socket.socket): The accepted connection, before the handshake.
+        """
+        reader = FrameReader()
+        deadline = time.monotonic() + reject_timeout
+        client_socket = self.accept_tls(client_socket, deadline)
+        try:
+            do_handshake(client_socket, deadline)
+            try:
+                reader.feed(call_before(client_socket, deadline, client_socket.recv, BUFFER_SIZE))
+            except (FramingError, TimeoutError):
+                pass
+            send_before(client_socket, reader.encode_message(JSONResponse("BUSY", BUSY_MESSAGE).to_dict()), deadline)
+            client_socket.shutdown()
+        except (SSL.Error, OSError):
+            pass
+        finally:
+            client_socket.close()
 
-            # Convertir las cadenas de fecha en objetos datetime
-            order_dates = [item.order_date for item in data]
+    def handle_message(self, received_message: bytes, codec=json_codec) -> JSONResponse:
+        """
+        Process a batch of client petitions and record its outcome and latency in the metrics.
 
-            # Ordenar las fechas de manera ascendente para que la primera solicitud sea la más antigua
-            order_dates.sort()
+        Args:
+            received_message (bytes): The encoded array of petitions sent by the client.
+            codec (JSONCodec | MsgPackCodec, optional): The codec of the connection.
 
-            # Verificar si han pasado menos de cuatro horas desde la primera solicitud
-            if order_dates[-1] - order_dates[0] < timedelta(hours=4):
+        Returns:
+            JSONResponse: The response for the client.
+        """
+        start = time.perf_counter()
+        try:
+            message = self.process_message(received_message, codec)
+        except Exception:
+            requests_total.labels("error").inc()
+            raise
+        finally:
+            request_duration_seconds.observe(time.perf_counter() - start)
+        requests_total.labels("success").inc()
+        return message
+
+    def process_message(self, received_message: bytes, codec=json_codec) -> JSONResponse:
+        """
+        Process a batch of client petitions.
+
+        The batch must belong to a single client. The client is rate limited, the petitions are
+        verified and stored, and the response to send back is returned. This is the protocol logic
+        shared by every server mode.
+
+        The message is decoded once, here, and the petitions are passed on already decoded.
+
+        Args:
+            received_message (bytes): The encoded array of petitions sent by the client.
+            codec (JSONCodec | MsgPackCodec, optional): The codec of the connection.
+
+        Returns:
+            JSONResponse: The response for the client.
+
+        Raises:
+            Exception: If the batch is invalid or the client has made too many requests.
+        """
+        with stage("decode"):
+            petitions = codec.loads(received_message)
+        client_id = {data['clientId'] for data in petitions}
+
+        if len(client_id) != 1:
+            logger.error(f"Invalid client_id: {client_id}")
+            raise Exception("Invalid client_id")
+
+        client_id = client_id.pop()
+        if isinstance(client_id, str) and client_id.isdigit():  # Los ids se guardan como enteros en la base de datos
+            client_id = int(client_id)
+        order_dates = [data['orderDate'] for data in petitions]
+        check = None
+        if self.worker_id is None:
+            self.check_client(client_id, order_dates)
+        else:
+            # Otro worker puede guardar peticiones del cliente a la vez: se comprueba al guardar el lote
+            check = functools.partial(self.check_client, client_id, reload=True)
+
+        log_payload(received_message)
+        try:
+            with db.connection_context():  # Devuelve la conexión al pool al terminar
+                results = ClientPetition.from_jsons(petitions, check=check)
+        except Exception:
+            if self.worker_id is None:
+                self.rate_limiter.release(client_id, order_dates)
+            raise
+        saved = [order_date for order_date, is_saved in zip(order_dates, results) if is_saved]
+        if self.worker_id is None:
+            self.rate_limiter.commit(client_id, order_dates, saved)
+        else:
+            self.rate_limiter.record(client_id, saved)
+        return JSONResponse("SUCCESS", "Message received successfully.")
+
+    def check_client(self, client_id, order_dates: list = None, reload: bool = False) -> None:
+        """
+        Rejects the client if it has made too many requests.
+
+        Args:
+            client_id: The client id.
+            order_dates (list, optional): The order dates of the batch, reserved in the rate limiter if the client
+                is allowed, so that concurrent batches of the client count them. Commit or release them afterwards.
+            reload (bool, optional): Replace what the rate limiter knows of the client with its latest petitions in
+                the database first. Used in worker mode, inside the transaction that saves the batch.
+
+        Raises:
+            Exception: If the client has made too many requests.
+        """
+        with stage("check_client"):
+            if reload:
+                self.rate_limiter.replace(client_id, ClientPetition.latest_order_dates(
+                    client_id, self.rate_limiter.max_requests + 1))
+            if order_dates is None:
+                allowed = self.rate_limiter.allow(client_id)
+            else:
+                allowed = self.rate_limiter.try_acquire(client_id, order_dates)
+            if not allowed:
+                rate_limited_total.inc()
                 logger.error(f"Client {client_id} has made too many requests")
                 raise Exception("Too many requests")
 
@@ -181,3 +448,131 @@ class Server:
         """
         self.running = False
         self.server_socket.close()
+        # Los hilos del pool terminan al sacar None de su cola; las conexiones en espera se cierran
+        for connections in (self.connections, self.rejections):
+            while True:
+                try:
+                    client_socket = connections.get_nowait()
+                except queue.Empty:
+                    break
+                if client_socket is not None:
+                    client_socket.close()
+        if self.handlers:
+            for _ in range(max_connections):
+                self.connections.put(None)
+            self.rejections.put(None)
+        queue_depth.set(0)
+        self.shutdown_services()
+
+    def shutdown_services(self) -> None:
+        """
+        Stop the background services started by prepare and the signature verification workers.
+        """
+        self.scheduler.shutdown()
+        signature_verifier.shutdown()
+        self.metrics_server.stop()
+        self.message_manager.close()
+        stop_logger()
+
+
+def check_admission_limits() -> None:
+    """
+    Check that every batch processed at once can get a connection of the database pool.
+
+    Raises:
+        ValueError: If max_in_flight is larger than the pool, since the batches left without a connection
+            would wait pool_timeout seconds and fail.
+    """
+    if max_in_flight > pool_size:
+        raise ValueError(f"[ADMISSION] max_in_flight ({max_in_flight}) is larger than [DATABASE] pool_size "
+                         f"({pool_size}): the batches left without a connection would fail after {pool_timeout} "
+                         f"seconds")
+
+
+def call_before(connection: SSL.Connection, deadline: float, method, *args):
+    """
+    Call a method of a non-blocking TLS connection, waiting for the socket whenever OpenSSL needs to
+    read or write, until the deadline.
+
+    Args:
+        connection (SSL.Connection): The connection.
+        deadline (float): The time.monotonic() by which the call must be done.
+        method (Callable): The method of the connection, as connection.recv.
+        *args: The arguments of the method.
+
+    Returns:
+        The result of the method.
+
+    Raises:
+        TimeoutError: If the call did not finish in time.
+    """
+    while True:
+        try:
+            return method(*args)
+        except SSL.WantReadError:
+            readable, writable = [connection], []
+        except SSL.WantWriteError:
+            readable, writable = [], [connection]
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not any(select.select(readable, writable, [], remaining)[:2]):
+            raise TimeoutError(f"{method.__name__} not completed in time")
+
+
+def do_handshake(connection: SSL.Connection, deadline: float) -> None:
+    """
+    Perform the TLS handshake of a non-blocking connection, giving up at the deadline.
+
+    Args:
+        connection (SSL.Connection): The accepted connection.
+        deadline (float): The time.monotonic() by which the handshake must be done.
+
+    Raises:
+        TimeoutError: If the handshake did not finish in time.
+    """
+    call_before(connection, deadline, connection.do_handshake)
+
+
+def send_before(connection: SSL.Connection, data: bytes, deadline: float) -> None:
+    """
+    Send all the data on a non-blocking connection, giving up at the deadline.
+
+    Args:
+        connection (SSL.Connection): The connection.
+        data (bytes): The data to send.
+        deadline (float): The time.monotonic() by which the data must be sent.
+
+    Raises:
+        TimeoutError: If the peer did not read the data in time.
+    """
+    # OpenSSL exige repetir una escritura incompleta con el mismo buffer: la vista empieza en la misma posición
+    view = memoryview(data)
+    sent = 0
+    while sent < len(view):
+        sent += call_before(connection, deadline, connection.send, view[sent:])
+
+
+def send_error(connection: SSL.Connection, reader: FrameReader, message: JSONResponse) -> None:
+    """
+    Send an error response, giving up after handshake_timeout seconds and ignoring a connection that is
+    already broken.
+
+    Args:
+        connection (SSL.Connection): The connection of the client.
+        reader (FrameReader): The frame reader of the connection, which knows the client's wire format.
+        message (JSONResponse): The error response.
+    """
+    try:
+        send_before(connection, reader.encode_message(message.to_dict()), time.monotonic() + handshake_timeout)
+    except (SSL.Error, OSError):
+        pass
+
+
+def create_keystore_if_missing() -> None:
+    """
+    Generate the key and certificate of the server and save them to the keystore, if it does not exist yet.
+    """
+    if not os.path.exists(keystores_path):
+        logger.info("Certificate or key not found in keystore. Generating new ones...")
+        server_key = generate_key_pair()
+        server_cert = generate_certificate(server_key, common_name)
+        save_key_and_certificate_with_alias(server_key, server_cert, server_alias)
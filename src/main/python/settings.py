@@ -0,0 +1,9 @@
+"""
+Settings of the server, read once from configuration.ini in the working directory.
+
+Every module takes its constants from this configuration instead of parsing the file again.
+"""
+from configparser import ConfigParser
+
+configuration = ConfigParser()
+configuration.read("configuration.ini")
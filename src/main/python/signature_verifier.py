@@ -0,0 +1,187 @@
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+from datetime import datetime
+
+from Cryptodome.Hash import SHA256
+
+from src.main.python.key_cache import KEY_CACHE_RESULTS, public_key_cache, record_lookups
+from src.main.python.settings import configuration
+from src.main.python.verification_cache import VerificationCache, verification_cache, verification_key
+
+# CONSTANTS
+verify_processes = configuration.getint("SIGNATURE", "verify_processes")
+verify_chunk_size = configuration.getint("SIGNATURE", "verify_chunk_size")
+
+
+def verify_signature(public_key, order_date: datetime, signature: bytes) -> bool:
+    """
+    Verifies the PKCS#1 v1.5 SHA-256 signature of an order date.
+
+    Args:
+        public_key (str | bytes): The base64 DER public key of the client, or the DER bytes.
+        order_date (datetime): The signed order date.
+        signature (bytes): The signature.
+
+    Returns:
+        bool: True if the signature is valid, False otherwise.
+    """
+    # Obtener la clave pública importada y su verificador de la caché
+    _, verifier = public_key_cache.get(public_key)
+
+    # Calcular el hash de la fecha de pedido codificada en UTF-8
+    digest = SHA256.new(order_date.strftime("%Y-%m-%d %H:%M:%S").encode('utf-8'))
+
+    # Verificar la firma
+    try:
+        verifier.verify(digest, signature)
+        return True  # La firma es válida
+    except ValueError:
+        return False  # La firma no es válida
+
+
+def verify_chunk(items: list) -> tuple:
+    """
+    Verifies a list of signatures. This is the task run by the worker processes.
+
+    The metrics of a worker process are not served, so the lookups of its public key cache during the
+    task are returned with the outcomes, for the server to count them.
+
+    Args:
+        items (list): Tuples of (public_key, order_date, signature).
+
+    Returns:
+        tuple: One bool per item, and the hits, misses and evictions of the public key cache.
+    """
+    before = public_key_cache.stats()
+    results = [verify_signature(*item) for item in items]
+    after = public_key_cache.stats()
+    return results, {name: after[name] - before[name] for _, name in KEY_CACHE_RESULTS}
+
+
+class SignatureVerifier:
+    """
+    Verifies the signatures of petition batches in a pool of worker processes.
+
+    RSA verification is CPU-bound and holds the GIL, so verifying on the connection threads uses a
+    single core however many clients are connected. The pool is shared by every connection: each
+    batch is split into chunks that run in parallel, and batches of different connections run at
+    the same time. A batch smaller than a chunk is verified on the calling thread, since sending it
+    to a worker costs more than it saves. Every worker keeps its own public key cache, whose lookups
+    are added to the metrics of the server.
+
+    The outcomes are kept in a VerificationCache, so a signature that is sent again, as clients do
+    when they retry, is not verified again.
+
+    Attributes:
+        processes (int): The number of worker processes. With 1, signatures are verified on the calling thread.
+        chunk_size (int): The maximum number of signatures sent to a worker in one task.
+        cache (VerificationCache): The cache of recent outcomes, or None to verify every signature.
+    """
+
+    def __init__(self, processes: int = verify_processes, chunk_size: int = verify_chunk_size,
+                 cache: VerificationCache = verification_cache) -> None:
+        """
+        Initializes the SignatureVerifier. The pool is started on first use.
+
+        Args:
+            processes (int, optional): The number of worker processes, 0 for one per core.
+            chunk_size (int, optional): The maximum number of signatures sent to a worker in one task.
+            cache (VerificationCache, optional): The cache of recent outcomes, or None to verify every signature.
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = max(1, chunk_size)
+        self.cache = cache
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        """
+        Returns the process pool, starting it if needed.
+
+        The workers are spawned rather than forked, because forking a process that already runs
+        handler threads could copy locks held by them.
+
+        Returns:
+            concurrent.futures.ProcessPoolExecutor: The pool.
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def verify_batch(self, items: list, all_or_nothing: bool = True) -> list:
+        """
+        Verifies a batch of signatures.
+
+        Args:
+            items (list): Tuples of (public_key, order_date, signature).
+            all_or_nothing (bool, optional): Stop at the first invalid signature. The items that were
+                not checked are reported as invalid, since the batch is rejected anyway.
+
+        Returns:
+            list: One bool per item, in the order of the items.
+        """
+        if self.cache is None:
+            return [bool(result) for result in self._verify(items, all_or_nothing)]
+
+        keys = [verification_key(*item) for item in items]
+        results = [self.cache.get(key) for key in keys]
+        if all_or_nothing and False in results:
+            return [bool(result) for result in results]
+        pending = [index for index, result in enumerate(results) if result is None]
+        verified = self._verify([items[index] for index in pending], all_or_nothing)
+        for index, result in zip(pending, verified):
+            if result is not None:
+                self.cache.put(keys[index], result)
+            results[index] = result
+        return [bool(result) for result in results]
+
+    def _verify(self, items: list, all_or_nothing: bool) -> list:
+        """
+        Verifies a batch of signatures, in the pool unless there is a single process or the batch is
+        smaller than a chunk.
+
+        Args:
+            items (list): Tuples of (public_key, order_date, signature).
+            all_or_nothing (bool): Stop at the first invalid signature.
+
+        Returns:
+            list: One bool per item, or None for the items left unchecked after an invalid signature.
+        """
+        if self.processes == 1 or len(items) < self.chunk_size:
+            results = []
+            for item in items:
+                results.append(verify_signature(*item))
+                if all_or_nothing and not results[-1]:
+                    break
+            return results + [None] * (len(items) - len(results))
+
+        pool = self._get_pool()
+        futures = {pool.submit(verify_chunk, items[start:start + self.chunk_size]): start
+                   for start in range(0, len(items), self.chunk_size)}
+        results = [None] * len(items)
+        for future in concurrent.futures.as_completed(futures):
+            start = futures[future]
+            chunk_results, key_cache_counts = future.result()
+            record_lookups(key_cache_counts)
+            results[start:start + len(chunk_results)] = chunk_results
+            if all_or_nothing and not all(chunk_results):
+                for pending in futures:
+                    pending.cancel()
+                break
+        return results
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker processes. The pool is started again if the verifier is used afterwards.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+signature_verifier = SignatureVerifier()
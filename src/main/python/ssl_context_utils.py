@@ -1,23 +1,56 @@
+import hashlib
+import json
 import os
-from configparser import ConfigParser
+import random
+import time
+from typing import TYPE_CHECKING
 
 import OpenSSL
-import jks
 from OpenSSL import SSL
+from loguru import logger
+
+from src.main.python.metrics import registry
+from src.main.python.settings import configuration
+
+if TYPE_CHECKING:
+    import jks
+
+try:
+    from cryptography.hazmat.bindings.openssl.binding import Binding
+    _lib = Binding.lib
+except ImportError:  # Sin los bindings no se distingue una reanudación de un handshake completo
+    _lib = None
 
 # CONSTANTS
 ASN1 = OpenSSL.crypto.FILETYPE_ASN1
-configuration = ConfigParser()
-configuration.read("configuration.ini")
 current_directory = os.path.dirname(os.path.abspath(__file__))
 keystore_password = configuration.get("KEYSTORE", "password")
 keystore_path = os.path.join(current_directory, configuration.get("KEYSTORE", "path"))
 certification_path = os.path.join(current_directory, configuration.get("CERTIFICATION", "path"))
+pem_cache_path = os.path.join(current_directory, configuration.get("KEYSTORE", "pem_cache"))
+session_cache = configuration.getboolean("TLS", "session_cache")
+session_timeout = configuration.getint("TLS", "session_timeout")
+session_tickets = configuration.getboolean("TLS", "session_tickets")
+ticket_rotation_interval = configuration.getfloat("TLS", "ticket_rotation_interval")
+SESSION_ID_CONTEXT = b"securehotel"
+TICKET_KEY_NAME_SIZE = 16
+BUFFER_SIZE = 65536
+# Tipos de TLS necesarios para leer el ticket de un ClientHello (RFC 8446)
+HANDSHAKE_RECORD = 22
+CLIENT_HELLO = 1
+PRE_SHARED_KEY_EXTENSION = 41
+
+tls_handshakes_total = registry.counter("securehotel_tls_handshakes_total", "Completed TLS handshakes, by kind.",
+                                        ("kind",))
+previous_ticket_key_total = registry.counter("securehotel_tls_previous_ticket_key_total",
+                                             "Connections offering a ticket of the previous ticket key, by "
+                                             "whether they resumed with it or moved to the current key.",
+                                             ("outcome",))
 
 import OpenSSL
 
 
-def load_keystore(keystore_path: str, keystore_password: str) -> jks.KeyStore:
+def load_keystore(keystore_path: str, keystore_password: str) -> "jks.KeyStore":
     """
     Loads a Java KeyStore file.
 
@@ -28,13 +61,15 @@ def load_keystore(keystore_path: str, keystore_password: str) -> jks.KeyStore:
     Returns:
         jks.KeyStore: The loaded keystore.
     """
+    import jks  # pyjks tarda en importarse y solo hace falta cuando el keystore cambia
+
     try:
         return jks.KeyStore.load(keystore_path, keystore_password)
     except jks.KeystoreException as e:
         raise ValueError(f"Invalid keystore path or password: {e}")
 
 
-def decrypt_key(pk_entry: jks.PrivateKeyEntry, key_password: str) -> None:
+def decrypt_key(pk_entry: "jks.PrivateKeyEntry", key_password: str) -> None:
     """
     Decrypts the private key entry.
 
@@ -46,7 +81,7 @@ def decrypt_key(pk_entry: jks.PrivateKeyEntry, key_password: str) -> None:
         pk_entry.decrypt(key_password)
 
 
-def load_certificates(pk_entry: jks.PrivateKeyEntry, keystore: jks.KeyStore) -> tuple:
+def load_certificates(pk_entry: "jks.PrivateKeyEntry", keystore: "jks.KeyStore") -> tuple:
     """
     Loads the public certificate and trusted certificates.
 
@@ -86,33 +121,350 @@ def create_ssl_context(pkey: OpenSSL.crypto.PKey, public_cert: OpenSSL.crypto.X5
     cert_store = ctx.get_cert_store()
     for cert in trusted_certs:
         cert_store.add_cert(cert)
+    configure_session_resumption(ctx)
     return ctx
 
 
-def jks_file_to_context(key_alias: str, key_password: str = None) -> OpenSSL.SSL.Context:
+def configure_session_resumption(ctx: OpenSSL.SSL.Context) -> None:
     """
-    Loads a Java KeyStore file into an OpenSSL Context object.
+    Lets clients resume their previous TLS session instead of doing a full handshake.
+
+    With session tickets the session state travels, encrypted, in the ticket kept by the client; the
+    ticket keys are generated at random for every context, so a new context comes with a new key (see
+    SessionTicketKeys).
+    Without tickets the sessions are kept in the cache of the context. Sessions expire after
+    session_timeout seconds either way.
+
+    Args:
+        ctx (OpenSSL.SSL.Context): The SSL context.
+    """
+    if not session_cache:
+        ctx.set_session_cache_mode(OpenSSL.SSL.SESS_CACHE_OFF)
+        ctx.set_options(OpenSSL.SSL.OP_NO_TICKET)
+        return
+    ctx.set_session_id(SESSION_ID_CONTEXT)
+    ctx.set_session_cache_mode(OpenSSL.SSL.SESS_CACHE_SERVER)
+    ctx.set_timeout(session_timeout)
+    if not session_tickets:
+        ctx.set_options(OpenSSL.SSL.OP_NO_TICKET)
+
+
+def session_reused(connection: OpenSSL.SSL.Connection) -> bool:
+    """
+    Checks whether the handshake of the connection resumed a previous session.
+
+    Args:
+        connection (OpenSSL.SSL.Connection): A connection with the handshake done.
+
+    Returns:
+        bool: True if the session was resumed, False otherwise.
+    """
+    return _lib is not None and bool(_lib.SSL_session_reused(connection._ssl))
+
+
+def record_handshake(connection: OpenSSL.SSL.Connection) -> None:
+    """
+    Counts a completed handshake as full or resumed.
+
+    Args:
+        connection (OpenSSL.SSL.Connection): A connection with the handshake done.
+    """
+    tls_handshakes_total.labels("resumed" if session_reused(connection) else "full").inc()
+
+
+def client_hello_ticket(data: bytes) -> bytes:
+    """
+    Returns the first session ticket offered in a TLS 1.3 ClientHello.
+
+    Args:
+        data (bytes): The first bytes sent by the client.
+
+    Returns:
+        bytes: The ticket, or None if the data is not a complete ClientHello offering one.
+    """
+    try:
+        if data[0] != HANDSHAKE_RECORD or data[5] != CLIENT_HELLO:
+            return None
+        # Cabecera del registro (5) y del mensaje (4), versión (2) y random (32)
+        position = 43
+        position += 1 + data[position]  # session_id
+        position += 2 + int.from_bytes(data[position:position + 2], "big")  # cipher_suites
+        position += 1 + data[position]  # compression_methods
+        end = position + 2 + int.from_bytes(data[position:position + 2], "big")
+        position += 2
+        while position + 4 <= end:
+            extension = int.from_bytes(data[position:position + 2], "big")
+            length = int.from_bytes(data[position + 2:position + 4], "big")
+            position += 4
+            if extension == PRE_SHARED_KEY_EXTENSION:
+                # identities: longitud de la lista (2), longitud de la primera identidad (2) y la identidad
+                identity_length = int.from_bytes(data[position + 2:position + 4], "big")
+                identity = data[position + 4:position + 4 + identity_length]
+                return identity if identity_length and len(identity) == identity_length else None
+            position += length
+    except IndexError:
+        return None
+    return None
+
+
+def _drain(connection: OpenSSL.SSL.Connection) -> bytes:
+    data = b""
+    while True:
+        try:
+            data += connection.bio_read(BUFFER_SIZE)
+        except OpenSSL.SSL.WantReadError:
+            return data
+
+
+def _loopback_handshake(ctx: OpenSSL.SSL.Context, session: OpenSSL.SSL.Session = None) -> tuple:
+    # Handshake en memoria entre un cliente y el contexto; devuelve el cliente y su ClientHello
+    client = OpenSSL.SSL.Connection(OpenSSL.SSL.Context(OpenSSL.SSL.TLS_METHOD), None)
+    client.set_connect_state()
+    if session is not None:
+        client.set_session(session)
+    server = OpenSSL.SSL.Connection(ctx, None)
+    server.set_accept_state()
+    client_hello = None
+    for connection, peer in ((client, server), (server, client), (client, server), (server, client)):
+        try:
+            connection.do_handshake()
+        except OpenSSL.SSL.WantReadError:
+            pass
+        data = _drain(connection)
+        client_hello = client_hello or data
+        peer.bio_write(data)
+    try:
+        client.recv(1)  # Procesa los tickets, que en TLS 1.3 llegan tras el handshake
+    except OpenSSL.SSL.WantReadError:
+        pass
+    return client, client_hello
+
+
+def ticket_key_name(ctx: OpenSSL.SSL.Context) -> bytes:
+    """
+    Returns the name of the session ticket key of a context, which OpenSSL writes at the start of
+    every ticket it issues.
+
+    It is learned with two handshakes in memory: the first one gets a ticket and the second one offers it.
+
+    Args:
+        ctx (OpenSSL.SSL.Context): A server SSL context.
+
+    Returns:
+        bytes: The key name, or None if the context issues no tickets.
+    """
+    try:
+        client, _ = _loopback_handshake(ctx)
+        # La sesión se toma con el cliente vivo: al liberarlo sin shutdown deja de ser reanudable
+        _, client_hello = _loopback_handshake(ctx, client.get_session())
+    except OpenSSL.SSL.Error as e:
+        logger.error(f"Could not learn the session ticket key name: {e}")
+        return None
+    ticket = client_hello_ticket(client_hello)
+    return None if ticket is None else ticket[:TICKET_KEY_NAME_SIZE]
+
+
+class SessionTicketKeys:
+    """
+    The SSL contexts of the server, one per session ticket key.
+
+    OpenSSL draws the ticket key of every context at random, and neither pyOpenSSL nor the bindings
+    of cryptography expose SSL_CTX_set_tlsext_ticket_keys, so a new key comes with a new context,
+    built from the key material already loaded. The previous context is kept for an overlap window
+    after a rotation: a client whose ClientHello offers a ticket of the previous key, recognised by
+    the key name at its start, is served by it and resumes.
+
+    A session resumed with the previous context gets its new tickets from the previous key too, so
+    the clients are moved to the current key during the window: a ticket of the previous key is
+    sent to the current context, with a full handshake, with a probability that grows from 0 right
+    after the rotation to 1 at the end of the window. The full handshakes are spread over the
+    window instead of all happening when the old key is dropped.
+
+    Attributes:
+        current (OpenSSL.SSL.Context): The context that issues the tickets.
+        overlap (float): The seconds the previous key is accepted after a rotation.
+    """
+
+    def __init__(self, pkey: OpenSSL.crypto.PKey, public_cert: OpenSSL.crypto.X509, trusted_certs: list,
+                 overlap: float = ticket_rotation_interval) -> None:
+        """
+        Initializes the SessionTicketKeys with a first context.
+
+        Args:
+            pkey (OpenSSL.crypto.PKey): The private key.
+            public_cert (OpenSSL.crypto.X509): The public certificate.
+            trusted_certs (list): The trusted certificates.
+            overlap (float, optional): The seconds the previous key is accepted after a rotation.
+        """
+        self._material = (pkey, public_cert, trusted_certs)
+        self.current = create_ssl_context(*self._material)
+        self.overlap = overlap
+        # Contexto anterior, nombre de su clave y momento de la rotación, juntos para leerlos sin bloqueo
+        self._previous = None
+
+    @property
+    def previous(self) -> OpenSSL.SSL.Context:
+        return None if self._previous is None else self._previous[0]
+
+    def rotate(self) -> None:
+        """
+        Starts issuing tickets with a new key, and forgets the key before the current one.
+        """
+        name = ticket_key_name(self.current)
+        context = create_ssl_context(*self._material)
+        self._previous = None if name is None or self.overlap <= 0 else (self.current, name, time.monotonic())
+        self.current = context
+
+    def context_for(self, client_hello: bytes) -> OpenSSL.SSL.Context:
+        """
+        Returns the context that can resume the session offered in a ClientHello.
+
+        Args:
+            client_hello (bytes): The first bytes sent by the client.
+
+        Returns:
+            OpenSSL.SSL.Context: The previous context if the ticket offered is one of its own and the
+                client is not moved to the current key yet, the current one otherwise.
+        """
+        previous = self._previous
+        if previous is not None:
+            context, name, rotated_at = previous
+            ticket = client_hello_ticket(client_hello)
+            if ticket is not None and ticket.startswith(name):
+                if random.random() >= (time.monotonic() - rotated_at) / self.overlap:
+                    previous_ticket_key_total.labels("resumed").inc()
+                    return context
+                previous_ticket_key_total.labels("moved").inc()
+        return self.current
+
+
+def load_pem_cache(keystore_digest: str, key_alias: str) -> tuple:
+    """
+    Loads the key material of the alias from the PEM cache, if it was derived from the current keystore.
+
+    Args:
+        keystore_digest (str): The SHA-256 of the current keystore file.
+        key_alias (str): The alias of the key.
+
+    Returns:
+        tuple: The private key, the public certificate and the trusted certificates, or None if the cache
+            is missing, stale or unreadable.
+    """
+    try:
+        with open(pem_cache_path, "r") as f:
+            cache = json.load(f)
+        if cache["keystore_sha256"] != keystore_digest or cache["alias"] != key_alias:
+            return None
+        pkey = OpenSSL.crypto.load_privatekey(OpenSSL.crypto.FILETYPE_PEM, cache["private_key"],
+                                              keystore_password.encode())
+        public_cert = OpenSSL.crypto.load_certificate(OpenSSL.crypto.FILETYPE_PEM, cache["certificate"])
+        trusted_certs = [OpenSSL.crypto.load_certificate(OpenSSL.crypto.FILETYPE_PEM, cert)
+                         for cert in cache["trusted_certificates"]]
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError, OpenSSL.crypto.Error) as e:
+        logger.error(f"Ignoring the keystore PEM cache: {e}")
+        return None
+    return pkey, public_cert, trusted_certs
+
+
+def save_pem_cache(keystore_digest: str, key_alias: str, pkey: OpenSSL.crypto.PKey,
+                   public_cert: OpenSSL.crypto.X509, trusted_certs: list) -> None:
+    """
+    Saves the key material of the alias to the PEM cache, readable only by the owner.
+
+    The private key is encrypted with the keystore password.
+
+    Args:
+        keystore_digest (str): The SHA-256 of the keystore file the material comes from.
+        key_alias (str): The alias of the key.
+        pkey (OpenSSL.crypto.PKey): The private key.
+        public_cert (OpenSSL.crypto.X509): The public certificate.
+        trusted_certs (list): The trusted certificates.
+    """
+    pem = OpenSSL.crypto.FILETYPE_PEM
+    cache = {
+        "keystore_sha256": keystore_digest,
+        "alias": key_alias,
+        "private_key": OpenSSL.crypto.dump_privatekey(pem, pkey, "aes-256-cbc", keystore_password.encode()).decode(),
+        "certificate": OpenSSL.crypto.dump_certificate(pem, public_cert).decode(),
+        "trusted_certificates": [OpenSSL.crypto.dump_certificate(pem, cert).decode() for cert in trusted_certs],
+    }
+    temporary_path = pem_cache_path + ".tmp"
+    try:
+        with open(os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump(cache, f)
+        os.replace(temporary_path, pem_cache_path)
+    except OSError as e:
+        logger.error(f"Could not save the keystore PEM cache: {e}")
+
+
+def load_key_material(key_alias: str, key_password: str = None) -> tuple:
+    """
+    Loads the private key and certificates of the alias.
+
+    Decoding the Java KeyStore is slow, so the decoded material is kept in a PEM cache tied to the
+    SHA-256 of the keystore file, and the keystore is only decoded again when it changes.
 
     Args:
         key_alias (str): The alias of the key to load.
         key_password (str, optional): The password for decrypting the key entry. Defaults to None.
 
     Returns:
-        OpenSSL.SSL.Context: The OpenSSL Context object loaded with the key and certificates.
+        tuple: The private key, the public certificate and the trusted certificates.
     """
+    with open(keystore_path, "rb") as f:
+        keystore_digest = hashlib.sha256(f.read()).hexdigest()
+    material = load_pem_cache(keystore_digest, key_alias)
+    if material is not None:
+        return material
+
     keystore = load_keystore(keystore_path, keystore_password)
     pk_entry = keystore.private_keys[key_alias]
     decrypt_key(pk_entry, key_password)
-    pkey = OpenSSL.crypto.load_privatekey(OpenSSL.crypto.FILETYPE_ASN1, pk_entry.pkey)
+    # pkey_pkcs8 lleva el algoritmo y, en ECDSA, la curva; pkey solo tiene la clave en bruto
+    pkey = OpenSSL.crypto.load_privatekey(OpenSSL.crypto.FILETYPE_ASN1, pk_entry.pkey_pkcs8)
     public_cert, trusted_certs = load_certificates(pk_entry, keystore)
+    save_pem_cache(keystore_digest, key_alias, pkey, public_cert, trusted_certs)
+    return pkey, public_cert, trusted_certs
 
-    # Save the certificate to a file
-    with open(certification_path, "wb") as f:
-        f.write(OpenSSL.crypto.dump_certificate(OpenSSL.crypto.FILETYPE_PEM, public_cert))
 
-    ctx = create_ssl_context(pkey, public_cert, trusted_certs)
-    return ctx
+def server_key_material(key_alias: str, key_password: str = None) -> tuple:
+    """
+    Loads the private key and certificates of the alias and saves its certificate to the certification path.
 
+    Args:
+        key_alias (str): The alias of the key to load.
+        key_password (str, optional): The password for decrypting the key entry. Defaults to None.
 
+    Returns:
+        tuple: The private key, the public certificate and the trusted certificates.
+    """
+    pkey, public_cert, trusted_certs = load_key_material(key_alias, key_password)
 
+    # Save the certificate to a file, unless it is already there
+    certificate = OpenSSL.crypto.dump_certificate(OpenSSL.crypto.FILETYPE_PEM, public_cert)
+    try:
+        with open(certification_path, "rb") as f:
+            unchanged = f.read() == certificate
+    except FileNotFoundError:
+        unchanged = False
+    if not unchanged:
+        with open(certification_path, "wb") as f:
+            f.write(certificate)
+    return pkey, public_cert, trusted_certs
 
+
+def jks_file_to_context(key_alias: str, key_password: str = None) -> OpenSSL.SSL.Context:
+    """
+    Loads a Java KeyStore file into an OpenSSL Context object.
+
+    Args:
+        key_alias (str): The alias of the key to load.
+        key_password (str, optional): The password for decrypting the key entry. Defaults to None.
+
+    Returns:
+        OpenSSL.SSL.Context: The OpenSSL Context object loaded with the key and certificates.
+    """
+    ctx = create_ssl_context(*server_key_material(key_alias, key_password))
+    return ctx
@@ -1,30 +1,115 @@
 from datetime import datetime
+import json
 import os
 
+from src.main.python.metrics import request_duration_seconds, requests_total
+
 
 def calculate_successful_ratio(total_messages, success_count):
     return (success_count / total_messages if total_messages > 0 else 0)*100*1.0
 
+
+class LogAggregator:
+    """
+    Counts the ERROR and SUCCESS lines of the month's log files incrementally.
+
+    For every log file it keeps, in a checkpoint file, the byte offset up to which it has been read
+    and the counts found so far, so every run only reads the bytes written since the previous one.
+    Files are followed by inode, so a log file renamed by the daily rotation keeps its progress, and
+    a file that shrank is read again from the start.
+
+    Attributes:
+        logs_dir (str): The directory of the log files.
+        checkpoint_path (str): The path of the checkpoint file.
+    """
+
+    def __init__(self, logs_dir: str, checkpoint_path: str) -> None:
+        """
+        Initializes the LogAggregator.
+
+        Args:
+            logs_dir (str): The directory of the log files.
+            checkpoint_path (str): The path of the checkpoint file.
+        """
+        self.logs_dir = logs_dir
+        self.checkpoint_path = checkpoint_path
+
+    def count(self, pattern: str) -> tuple:
+        """
+        Reads the new lines of the log files whose name starts with the pattern.
+
+        Args:
+            pattern (str): The prefix of the log files to count, the month as YYYY-MM.
+
+        Returns:
+            tuple: The error count and the success count of all the matching files.
+        """
+        checkpoint = self._load_checkpoint()
+        if checkpoint.get("month") != pattern:
+            checkpoint = {"month": pattern, "files": {}}
+        known = {entry["inode"]: entry for entry in checkpoint["files"].values()}
+
+        files = {}
+        for file in os.listdir(self.logs_dir):
+            if not file.startswith(pattern):
+                continue
+            path = os.path.join(self.logs_dir, file)
+            stat = os.stat(path)
+            entry = known.get(stat.st_ino)
+            if entry is None or stat.st_size < entry["offset"]:
+                entry = {"inode": stat.st_ino, "offset": 0, "error": 0, "success": 0}
+            if stat.st_size > entry["offset"]:
+                self._read_new_lines(path, entry)
+            files[file] = entry
+
+        checkpoint["files"] = files
+        self._save_checkpoint(checkpoint)
+        return sum(entry["error"] for entry in files.values()), sum(entry["success"] for entry in files.values())
+
+    @staticmethod
+    def _read_new_lines(path: str, entry: dict) -> None:
+        """
+        Counts the complete lines written after the offset of the entry and moves the offset past them.
+
+        A line that is still being written is left for the next run.
+        """
+        with open(path, "rb") as log_file:
+            log_file.seek(entry["offset"])
+            data = log_file.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if b"ERROR" in line:
+                entry["error"] += 1
+            elif b"SUCCESS" in line:
+                entry["success"] += 1
+        entry["offset"] += end
+
+    def _load_checkpoint(self) -> dict:
+        try:
+            with open(self.checkpoint_path, "r") as checkpoint_file:
+                return json.load(checkpoint_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_checkpoint(self, checkpoint: dict) -> None:
+        # Se escribe en un fichero temporal y se renombra para no dejar nunca un checkpoint a medias
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(temporary_path, self.checkpoint_path)
+
+
 def get_report():
     logs_dir = "../logs/"
     reports_dir = "../reports/"
     evaluation = "../reports/evaluation.txt"
+    checkpoint = "../reports/log_checkpoint.json"
     
     now = datetime.now()
     
     pattern = "{:04d}-{:02d}".format(now.year, now.month)
         
-    error_count = 0
-    success_count = 0
-    
-    for file in os.listdir(logs_dir):
-        if file.startswith(pattern):
-            with open(os.path.join(logs_dir, file), "r") as log_file:
-                for line in log_file:
-                    if "ERROR" in line:
-                        error_count += 1
-                    elif "SUCCESS" in line:
-                        success_count += 1
+    error_count, success_count = LogAggregator(logs_dir, checkpoint).count(pattern)
     
     with open(evaluation, "r") as evaluation_file:
         last_lines = evaluation_file.readlines()[-2:]
@@ -42,6 +127,9 @@ def get_report():
     
     eval = calculate_successful_ratio(success_count + error_count, success_count)
     
+    successful_requests = requests_total.labels("success").value
+    failed_requests = requests_total.labels("error").value
+
     report_name = f"Report-{pattern}.txt"
     report_file_path = os.path.join(reports_dir, report_name)
 
@@ -53,6 +141,9 @@ def get_report():
         report_file.write("Total successful messages: {}\n".format(success_count))
         report_file.write("Total error messages: {}\n\n".format(error_count))
         report_file.write("Percentage of complete messages: {}\n\n".format(eval))
+        report_file.write("Requests since server start: {}\n".format(successful_requests + failed_requests))
+        report_file.write("Failed requests since server start: {}\n".format(failed_requests))
+        report_file.write("Request latency p99 (ms): {:.2f}\n\n".format(request_duration_seconds.quantile(0.99) * 1000))
         report_file.write("=" * 50)        
         
     if (eval > previous_month_percentage and eval > second_previous_month_percentage) or eval == previous_month_percentage:
@@ -0,0 +1,205 @@
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+from loguru import logger
+
+from src.main.python.metrics import MetricsRegistry, MetricsServer, metrics_enabled, registry
+from src.main.python.models import ClientPetition, db
+from src.main.python.server import check_admission_limits, create_keystore_if_missing
+from src.main.python.settings import configuration
+from src.main.python.signature_verifier import signature_verifier, verify_processes
+
+# CONSTANTS
+supervisor_workers = configuration.getint("SUPERVISOR", "workers")
+stats_interval = configuration.getfloat("SUPERVISOR", "stats_interval")
+restart_delay = configuration.getfloat("SUPERVISOR", "restart_delay")
+stop_timeout = configuration.getfloat("SUPERVISOR", "stop_timeout")
+
+worker_restarts_total = registry.counter("securehotel_worker_restarts_total",
+                                         "Worker processes restarted by the supervisor after exiting.")
+workers_alive = registry.gauge("securehotel_workers_alive", "Worker processes running.")
+
+
+def run_worker(server_class: type, host: str, port: int, worker_id: int, workers: int,
+               stats: multiprocessing.Queue) -> None:
+    """
+    Runs one worker process of the Supervisor.
+
+    The server binds the shared port with SO_REUSEPORT and sends a snapshot of its metrics to the
+    supervisor every stats_interval seconds. SIGTERM stops it.
+
+    Unless verify_processes is set, the workers share the cores for signature verification: each one
+    starts cores // workers verification processes, and verifies on its own threads with one core or
+    less.
+
+    Args:
+        server_class (type): Server or AsyncServer.
+        host (str): Host IP address.
+        port (int): Port number.
+        worker_id (int): The index of the worker.
+        workers (int): The number of worker processes.
+        stats (multiprocessing.Queue): The queue of metrics snapshots read by the supervisor.
+    """
+    if not verify_processes:
+        signature_verifier.processes = max(1, (os.cpu_count() or 1) // workers)
+    server = server_class(host, port, worker_id=worker_id)
+    server.scheduler.every(stats_interval, lambda: stats.put((worker_id, registry.snapshot())),
+                           name="metrics_snapshot")
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    server.start()
+
+
+class Supervisor:
+    """
+    Runs the server in several worker processes that share the port.
+
+    Every worker is a complete server with its own SSL context, listening on the same port with
+    SO_REUSEPORT, so the kernel spreads the connections among them and each one uses its own core.
+    They share the SQLite database, which the supervisor migrates once before starting them. Workers
+    that exit are started again, and the metrics of all the workers are served together.
+
+    The session ticket keys are not shared: OpenSSL draws them at random for every SSL context and
+    pyOpenSSL offers no way to install the same keys in every worker. The kernel picks the worker
+    of every new connection, so a client that reconnects resumes its TLS session only when it lands
+    on the worker that issued its ticket, about one time in workers.
+
+    Attributes:
+        server_class (type): Server or AsyncServer.
+        host (str): Host IP address.
+        port (int): Port number.
+        workers (int): The number of worker processes.
+    """
+
+    def __init__(self, server_class: type, host: str, port: int, workers: int = supervisor_workers) -> None:
+        """
+        Initializes the Supervisor.
+
+        Args:
+            server_class (type): Server or AsyncServer.
+            host (str): Host IP address.
+            port (int): Port number.
+            workers (int, optional): The number of worker processes, 0 for one per CPU.
+        """
+        self.server_class = server_class
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count()
+        self.running = False
+        self.processes = {}
+        self.snapshots = {}
+        # Métricas de los workers que ya terminaron, para que los contadores no vuelvan atrás
+        self.retired = MetricsRegistry()
+        self.metrics_server = MetricsServer(render=self.render_metrics)
+        # Los procesos nuevos no heredan hilos, conexiones ni sockets del supervisor
+        self.mp_context = multiprocessing.get_context("spawn")
+        self.stats = self.mp_context.Queue()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """
+        Prepares the shared resources, starts the workers and supervises them until stop is called.
+        """
+        check_admission_limits()  # Antes de arrancar workers que fallarían al crear su servidor, una y otra vez
+        ClientPetition.migrate()
+        db.close_all()
+        create_keystore_if_missing()
+        if metrics_enabled:
+            self.metrics_server.start()
+        for worker_id in range(self.workers):
+            self.start_worker(worker_id)
+        self.running = True
+        logger.info(f"Supervisor running {self.workers} workers on {self.host}:{self.port}")
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.signal_workers(signum))
+
+        while not self._stopped.is_set():
+            self.collect_stats(timeout=0.5)
+            for worker_id, process in list(self.processes.items()):
+                if not process.is_alive() and not self._stopped.is_set():
+                    logger.error(f"Worker {worker_id} exited with code {process.exitcode}, restarting it")
+                    worker_restarts_total.inc()
+                    self.retire(worker_id)
+                    self._stopped.wait(restart_delay)
+                    if not self._stopped.is_set():
+                        self.start_worker(worker_id)
+        self.stop_workers()
+        self.metrics_server.stop()
+
+    def start_worker(self, worker_id: int) -> None:
+        process = self.mp_context.Process(target=run_worker, name=f"worker-{worker_id}",
+                                          args=(self.server_class, self.host, self.port, worker_id, self.workers,
+                                                self.stats))
+        process.start()
+        self.processes[worker_id] = process
+        workers_alive.set(sum(process.is_alive() for process in self.processes.values()))
+
+    def stop_workers(self) -> None:
+        """
+        Asks every worker to stop and kills the ones still running after stop_timeout seconds.
+        """
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + stop_timeout
+        for process in self.processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
+        workers_alive.set(0)
+
+    def signal_workers(self, signum: int) -> None:
+        """
+        Sends a signal to every running worker, as SIGUSR1 to toggle their profilers.
+        """
+        for process in list(self.processes.values()):
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    def collect_stats(self, timeout: float) -> None:
+        """
+        Keeps the latest metrics snapshot of every worker.
+        """
+        try:
+            worker_id, snapshot = self.stats.get(timeout=timeout)
+        except queue.Empty:
+            return
+        with self._lock:
+            self.snapshots[worker_id] = snapshot
+
+    def retire(self, worker_id: int) -> None:
+        """
+        Keeps the counters and histograms of a worker that exited. Its gauges no longer apply.
+        """
+        with self._lock:
+            snapshot = self.snapshots.pop(worker_id, [])
+            self.retired.merge([metric for metric in snapshot if metric[2] != "gauge"])
+        workers_alive.set(sum(process.is_alive() for process in self.processes.values()))
+
+    def render_metrics(self) -> str:
+        """
+        Renders the metrics of the supervisor and the sum of the metrics of every worker.
+
+        Returns:
+            str: The metrics in the Prometheus text format.
+        """
+        aggregated = MetricsRegistry()
+        aggregated.merge(registry.snapshot())
+        with self._lock:
+            aggregated.merge(self.retired.snapshot())
+            for snapshot in self.snapshots.values():
+                aggregated.merge(snapshot)
+        return aggregated.render()
+
+    def stop(self) -> None:
+        """
+        Stops supervising and stops the workers. It can be called from any thread.
+        """
+        self.running = False
+        self._stopped.set()
@@ -0,0 +1,147 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from src.main.python.metrics import registry
+from src.main.python.settings import configuration
+
+# CONSTANTS
+verification_cache_size = configuration.getint("SIGNATURE", "verification_cache_size")
+verification_cache_ttl = configuration.getfloat("SIGNATURE", "verification_cache_ttl")
+ORDER_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+verification_cache_total = registry.counter("securehotel_verification_cache_total",
+                                            "Signature verification cache lookups, by result.", ("result",))
+
+
+def digest(*parts) -> bytes:
+    """
+    Returns the SHA-256 of the parts, each one prefixed with its type and length so that different
+    parts can not produce the same digest.
+
+    Args:
+        *parts (str | bytes | int | datetime): The values to digest. Dates are taken as the signed text.
+
+    Returns:
+        bytes: The digest.
+    """
+    sha256 = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, datetime):
+            part = part.strftime(ORDER_DATE_FORMAT)
+        if isinstance(part, bytes):
+            tag = b"b"
+        else:
+            tag = b"s"
+            part = str(part).encode("utf-8")
+        sha256.update(tag + len(part).to_bytes(4, "big") + part)
+    return sha256.digest()
+
+
+def verification_key(public_key, order_date: datetime, signature: bytes) -> bytes:
+    """
+    Returns the key of a signature in the VerificationCache.
+
+    Args:
+        public_key (str | bytes): The public key, as sent by the client.
+        order_date (datetime): The signed order date.
+        signature (bytes): The signature.
+
+    Returns:
+        bytes: The key.
+    """
+    return digest(public_key, order_date, signature)
+
+
+class VerificationCache:
+    """
+    Bounded LRU cache of recent signature verification outcomes, valid or not.
+
+    Clients that retry after an error resend the same public key, order date and signature, and the
+    verification of a retried petition is served from here instead of repeating the RSA operation.
+    The keys are the digest of the whole triple, so a hit always has the outcome that verifying again
+    would give: there are no false positives. Entries expire after ttl seconds.
+
+    Attributes:
+        max_size (int): The maximum number of outcomes kept.
+        ttl (float): The seconds an outcome is kept for.
+    """
+
+    def __init__(self, max_size: int = verification_cache_size, ttl: float = verification_cache_ttl) -> None:
+        """
+        Initializes an empty VerificationCache.
+
+        Args:
+            max_size (int, optional): The maximum number of outcomes kept.
+            ttl (float, optional): The seconds an outcome is kept for.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes):
+        """
+        Returns the outcome of a signature verified recently.
+
+        Args:
+            key (bytes): The key returned by verification_key.
+
+        Returns:
+            bool: The outcome, or None if it is not cached or has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                verification_cache_total.labels("miss").inc()
+                return None
+            self._entries.move_to_end(key)
+        verification_cache_total.labels("hit").inc()
+        return entry[0]
+
+    def put(self, key: bytes, valid: bool) -> None:
+        """
+        Stores the outcome of a verification.
+
+        Args:
+            key (bytes): The key returned by verification_key.
+            valid (bool): Whether the signature was valid.
+        """
+        with self._lock:
+            self._entries[key] = (valid, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes every outcome.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns the size and the hit statistics of the cache.
+
+        Returns:
+            dict: The size, maximum size, hits, misses and hit rate.
+        """
+        hits = verification_cache_total.labels("hit").value
+        misses = verification_cache_total.labels("miss").value
+        lookups = hits + misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups > 0 else 0.0,
+        }
+
+
+verification_cache = VerificationCache() if verification_cache_size > 0 else None